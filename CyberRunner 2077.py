@@ -1,15 +1,68 @@
+import time
+STARTUP_START = time.perf_counter()  # before the heavy imports, for the startup report
+
 import pygame
+import numpy as np
 import random
 import math
 import sys
-
-# Initialize Pygame
-pygame.init()
+import os
+import csv
+import json
+import argparse
+import multiprocessing
+import struct
+import zlib
+import sqlite3
+import threading
+import queue
+import functools
+import shutil
+import tempfile
+import http.server
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque, namedtuple
 
 # Constants
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 600
-FPS = 60
+FPS = 60  # simulation ticks per second; rendering runs at its own rate
+MAX_CATCHUP_TICKS = 5  # ticks run per rendered frame before the game is allowed to slow down
+GROUND_HEIGHT = 50
+
+# Resolved font paths and other rebuildable data live here between launches
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'cyberrunner')
+FONT_CACHE_PATH = os.path.join(CACHE_DIR, 'fonts.json')
+LEVEL_CACHE_DIR = os.path.join(CACHE_DIR, 'levels')
+
+# High scores and run statistics; past RUN_HISTORY_LIMIT runs the log is compacted
+DATA_DIR = os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'), 'cyberrunner')
+STATS_PATH = os.path.join(DATA_DIR, 'stats.db')
+RUN_HISTORY_LIMIT = 200000
+
+# Ghosts keep the player's position every GHOST_STEP ticks and are streamed
+# from disk GHOST_WINDOW samples at a time, drawn tinted and translucent
+GHOST_DIR = os.path.join(DATA_DIR, 'ghosts')
+GHOST_STEP = 2
+GHOST_WINDOW = 512
+GHOST_HIDDEN = -32768  # sample past the end of a ghost's run
+GHOST_TINT = (160, 210, 255)
+GHOST_ALPHA = 90
+
+# Background layer cache: the day/night brightness is quantized into buckets
+# and each bucket's gradient + ground is baked once, at the render size, into
+# a full-screen surface that is kept for the whole session. The cycle sweeps
+# every bucket, so none may be evicted (16 layers are about 38 MB at 1000x600)
+BRIGHTNESS_LEVELS = 16
+
+# Rendered text surfaces kept by the shared text cache
+TEXT_CACHE_SIZE = 256
+
+# Particle effects
+STAR_COUNT = 100
+TRAIL_CAPACITY = 1024
+TRAIL_LIFE = 20
 
 # Colors - Cyberpunk palette
 BLACK = (0, 0, 0)
@@ -24,12 +77,426 @@ WHITE = (255, 255, 255)
 YELLOW = (255, 255, 0)
 CYBER_YELLOW = (255, 223, 0)
 
+# Player shapes, in menu order
+SHAPES = ['rect', 'circle', 'ellipse', 'triangle', 'square']
+
+# Obstacle types, in spawn weight order
+OBSTACLE_TYPES = ["red", "green", "purple", "neutral"]
+
+# Per-type constants: width, height, color and the spawn y range
+OBSTACLE_SPECS = {
+    "red": (50, 50, RED, (SCREEN_HEIGHT - 200, SCREEN_HEIGHT - 60)),
+    "green": (40, 40, NEON_GREEN, (SCREEN_HEIGHT - 180, SCREEN_HEIGHT - 80)),
+    "purple": (40, 40, NEON_PURPLE, (SCREEN_HEIGHT - 180, SCREEN_HEIGHT - 80)),
+    "neutral": (40, 40, (100, 100, 100), (SCREEN_HEIGHT - 110, SCREEN_HEIGHT - 110)),  # Gray
+}
+SPAWN_WEIGHTS = [0.4, 0.2, 0.2, 0.2]
+SPAWN_CUM_WEIGHTS = [sum(SPAWN_WEIGHTS[:i + 1]) for i in range(len(SPAWN_WEIGHTS))]
+
+# Level schedules are generated this many obstacles at a time and store
+# each height as one byte above the lowest spawn height
+SCHEDULE_CHUNK = 64
+SCHEDULE_Y_BASE = min(spec[3][0] for spec in OBSTACLE_SPECS.values())
+
 # Game states
 MENU = 0
 PLAYING = 1
 PAUSED = 2
 GAME_OVER = 3
 
+# Simulation input bits, one step() call per tick
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 4
+REPLAY_PAUSE = 8  # replay-only bit: the frame was spent paused
+
+class TextCache:
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        # Same argument order as Font.render so call sites read the same
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return {'size': len(self.surfaces), 'hits': self.hits, 'misses': self.misses}
+
+text_cache = TextCache()
+startup_timings = OrderedDict()
+startup_last = [STARTUP_START]
+
+def startup_phase(name):
+    now = time.perf_counter()
+    startup_timings[name] = now - startup_last[0]
+    startup_last[0] = now
+
+def startup_report():
+    total = sum(startup_timings.values())
+    phases = ', '.join(f"{name} {seconds * 1000:.1f}" for name, seconds in startup_timings.items())
+    return f"Startup (ms): {phases}; total {total * 1000:.1f}"
+
+def init_display():
+    # Only the subsystems the game uses; audio and joystick never start
+    if not pygame.display.get_init():
+        pygame.display.init()
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+fonts = {}
+font_paths = None
+
+def save_font_paths():
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(FONT_CACHE_PATH + '.tmp', 'w') as f:
+            json.dump(font_paths, f)
+        os.replace(FONT_CACHE_PATH + '.tmp', FONT_CACHE_PATH)
+    except OSError:
+        pass
+
+def resolve_font(name, bold):
+    # SysFont scans every installed font on its first call. Its answer (the
+    # file and whether bold has to be synthesized) is cached on disk instead
+    global font_paths
+    if font_paths is None:
+        try:
+            with open(FONT_CACHE_PATH) as f:
+                font_paths = json.load(f)
+        except (OSError, ValueError):
+            font_paths = {}
+    key = f"{name}:{int(bold)}"
+    entry = font_paths.get(key)
+    if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+        entry = pygame.font.SysFont(name, 0, bold=bold, constructor=lambda path, size, set_bold, set_italic: [path, set_bold])
+        font_paths[key] = entry
+        save_font_paths()
+    return entry
+
+def get_font(name, size, bold=False):
+    # Fonts are opened on first use and kept
+    key = (name, size, bold)
+    font = fonts.get(key)
+    if font is None:
+        path, synthetic_bold = resolve_font(name, bold)
+        font = pygame.font.Font(path, size)
+        font.set_bold(synthetic_bold)
+        fonts[key] = font
+    return font
+
+particle_stamps = {}
+
+def get_particle_stamp(size):
+    # Pixel offsets covered by pygame.draw.circle of this radius
+    stamp = particle_stamps.get(size)
+    if stamp is None:
+        surface = pygame.Surface((2 * size + 2, 2 * size + 2))
+        pygame.draw.circle(surface, WHITE, (size + 1, size + 1), size)
+        dx, dy = np.nonzero(pygame.surfarray.array2d(surface))
+        stamp = (dx - size - 1, dy - size - 1)
+        particle_stamps[size] = stamp
+    return stamp
+
+class ParticleSystem:
+    # Struct-of-arrays pool: particle i lives in slot i of every array and the
+    # live particles are always packed at the front, so updates and culls are
+    # single vectorized operations over [:count]
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.int8)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.arrays = (self.x, self.y, self.vx, self.vy, self.size, self.life)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, size, life, vx=0.0, vy=0.0):
+        if self.count == self.capacity:
+            return False
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.size[i] = size
+        self.life[i] = life
+        self.count += 1
+        return True
+
+    def emit_many(self, x, y, size, life, vx=0.0, vy=0.0):
+        n = min(len(x), self.capacity - self.count)
+        new = slice(self.count, self.count + n)
+        for array, values in zip(self.arrays, (x, y, vx, vy, size, life)):
+            array[new] = values if np.isscalar(values) else values[:n]
+        self.count += n
+        return n
+
+    def update(self, dx=0.0):
+        n = self.count
+        self.x[:n] += self.vx[:n] + dx
+        self.y[:n] += self.vy[:n]
+        self.life[:n] -= 1
+        self.cull(self.life[:n] > 0)
+
+    def cull(self, keep):
+        # Compact the survivors to the front in one pass per array
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for array in self.arrays:
+            array[:kept] = array[:n][keep]
+        self.count = kept
+
+    def draw(self, surface, color, alpha=255, scale=1.0):
+        # scale maps the logical positions and sizes onto the surface's pixels
+        n = self.count
+        if n == 0 or (np.isscalar(alpha) and alpha <= 0):
+            return
+        if scale != 1.0:
+            xs = self.x[:n] * scale
+            ys = self.y[:n] * scale
+            sizes = np.maximum(1, np.rint(self.size[:n] * scale)).astype(self.size.dtype)
+        else:
+            xs, ys, sizes = self.x[:n], self.y[:n], self.size[:n]
+        if surface.get_bytesize() != 4:
+            for x, y, size in zip(xs, ys, sizes):
+                pygame.draw.circle(surface, color, (int(x), int(y)), int(size))
+            return
+
+        # Stamp every particle's circle into one list of pixel indices,
+        # respecting the surface clip. Weights are 7-bit so the blend fits int16
+        clip = surface.get_clip()
+        uniform = np.isscalar(alpha)
+        weight = np.rint(np.minimum(np.asarray(alpha, dtype=np.float32), 255) * (128 / 255)).astype(np.int16)
+        xs = xs.astype(np.int32)
+        ys = ys.astype(np.int32)
+        px, py, pw = [], [], []
+        for size in np.flatnonzero(np.bincount(sizes)):
+            selected = sizes == size
+            dx, dy = get_particle_stamp(int(size))
+            px.append((xs[selected, None] + dx).ravel())
+            py.append((ys[selected, None] + dy).ravel())
+            if not uniform:
+                pw.append(np.repeat(weight[selected], len(dx)))
+        px, py = np.concatenate(px), np.concatenate(py)
+        inside = (px >= clip.left) & (px < clip.right) & (py >= clip.top) & (py < clip.bottom)
+        index = py[inside] * (surface.get_pitch() // 4) + px[inside]
+        pw = weight if uniform else np.concatenate(pw)[inside, None]
+
+        # Alpha-blend all of them at once on the raw 32-bit pixels
+        source = np.array([surface.map_rgb(color)], dtype=np.uint32).view(np.uint8).astype(np.int16)
+        buffer = surface.get_buffer()
+        pixels = np.frombuffer(buffer, dtype=np.uint32)
+        dest = pixels[index].view(np.uint8).reshape(-1, 4).astype(np.int16)
+        dest += ((source - dest) * pw) >> 7
+        pixels[index] = dest.astype(np.uint8).view(np.uint32).ravel()
+        del pixels, buffer
+
+class Starfield(ParticleSystem):
+    # Stars never expire; they wrap back to the right edge at a new height
+    def __init__(self, count, rng):
+        super().__init__(count)
+        self.rng = rng
+        self.emit_many(rng.integers(0, SCREEN_WIDTH + 1, count),
+                       rng.integers(0, SCREEN_HEIGHT + 1, count),
+                       rng.integers(1, 4, count),
+                       np.inf,
+                       vx=-rng.uniform(0.1, 0.5, count))
+
+    def update(self, dx=0.0):
+        n = self.count
+        x = self.x[:n]
+        x += self.vx[:n] + dx
+        wrapped = x < 0
+        count = int(np.count_nonzero(wrapped))
+        if count:
+            x[wrapped] = SCREEN_WIDTH
+            self.y[:n][wrapped] = self.rng.integers(0, SCREEN_HEIGHT + 1, count)
+
+class FrameProfiler:
+    # Per-phase timings for Game.run. Each phase is closed by mark(name), which
+    # returns straight away while profiling is off. The overlay summarizes a
+    # rolling window; every frame since start_run also lands in a histogram,
+    # so a run of any length can be summarized when it ends
+    PHASES = ('events', 'update', 'background', 'obstacles', 'ghosts', 'player', 'ui', 'screens', 'flip', 'tick')
+    RUN_BIN_MS = 0.05
+    RUN_BINS = 2000  # up to 100 ms; slower frames share the last bin
+
+    def __init__(self, window=FPS * 5):
+        self.enabled = False
+        self.recording = False
+        self.samples = {phase: deque(maxlen=window) for phase in self.PHASES + ('work', 'frame')}
+        self.rows = {phase: row for row, phase in enumerate(self.samples)}
+        self.start_run()
+        self.frames = []
+        self.frame_count = 0
+        self.missed = 0
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.frame_start = self.last = 0.0
+        self.overlay_surface = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last = time.perf_counter()
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        current = self.current
+        current['frame'] = self.last - self.frame_start
+        current['work'] = current['frame'] - current['tick']
+        rows, counts, totals = self.rows, self.run_counts, self.run_totals
+        bins_per_second, last = 1000 / self.RUN_BIN_MS, self.RUN_BINS - 1
+        for phase, seconds in current.items():
+            self.samples[phase].append(seconds)
+            row = rows[phase]
+            totals[row] += seconds
+            counts[row, min(int(seconds * bins_per_second), last)] += 1
+        self.frame_count += 1
+        # A frame is missed when its work alone overran the FPS budget
+        if current['work'] > 1 / FPS:
+            self.missed += 1
+        if self.recording:
+            self.frames.append(current)
+
+    def summary(self):
+        stats = {}
+        for phase, samples in self.samples.items():
+            if samples:
+                ms = np.array(samples) * 1000
+                stats[phase] = {'mean': float(ms.mean()),
+                                'p95': float(np.percentile(ms, 95)),
+                                'p99': float(np.percentile(ms, 99))}
+        return stats
+
+    def start_run(self):
+        self.run_counts = np.zeros((len(self.rows), self.RUN_BINS), dtype=np.int64)
+        self.run_totals = [0.0] * len(self.rows)
+
+    def run_summary(self):
+        # Like summary, over every frame since start_run; percentiles are
+        # read off the histogram, to the nearest bin
+        stats = {}
+        for phase, row in self.rows.items():
+            counts = self.run_counts[row]
+            frames = counts.sum()
+            if frames:
+                p95, p99 = (np.searchsorted(np.cumsum(counts), [0.95 * frames, 0.99 * frames]) + 0.5) * self.RUN_BIN_MS
+                stats[phase] = {'mean': float(self.run_totals[row] * 1000 / frames), 'p95': float(p95), 'p99': float(p99)}
+        return stats
+
+    def draw(self, surface, extra_lines=()):
+        # Re-rendered a few times a second; the numbers are unreadable any faster
+        if self.overlay_surface is None or self.frame_count % 15 == 0:
+            font = get_font('arial', 16)
+            lines = [f"{'phase':<10} {'mean':>6} {'p95':>6} {'p99':>6} ms"]
+            for phase, stats in self.summary().items():
+                lines.append(f"{phase:<10} {stats['mean']:>6.2f} {stats['p95']:>6.2f} {stats['p99']:>6.2f}")
+            lines.append(f"missed {self.missed} of {self.frame_count} frames at {FPS} FPS")
+            lines.extend(extra_lines)
+            self.overlay_surface = pygame.Surface((320, 20 * len(lines) + 10), pygame.SRCALPHA)
+            self.overlay_surface.fill((0, 0, 0, 180))
+            for i, line in enumerate(lines):
+                self.overlay_surface.blit(font.render(line, True, WHITE), (8, 5 + 20 * i))
+        surface.blit(self.overlay_surface, (20, 70))
+
+    def export(self, path):
+        # Per-frame timings in milliseconds, CSV or JSON by file extension
+        columns = ('frame',) + self.PHASES
+        rows = [{phase: round(frame[phase] * 1000, 4) for phase in columns} for frame in self.frames]
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.csv'):
+                writer = csv.DictWriter(f, columns)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump({'fps': FPS, 'missed': self.missed, 'summary': self.summary(), 'frames': rows}, f)
+
+class LatencyProbe:
+    # Input-to-display latency of jump presses: when each press was made,
+    # when the loop polled it and the first flip whose frame shows the tick
+    # that used it in full. Pygame doesn't pass on SDL's event timestamps,
+    # so a real key press counts as made when it is polled; presses posted by
+    # the latency command carry their own time in `pressed_at`
+    def __init__(self):
+        self.polled = []   # (pressed, polled) waiting for a tick
+        self.ticked = []   # (pressed, polled, tick) waiting for a flip
+        self.samples = []  # (pressed, polled, shown)
+
+    def press(self, event, now):
+        self.polled.append((getattr(event, 'pressed_at', now), now))
+
+    def tick(self, tick):
+        self.ticked.extend((pressed, polled, tick) for pressed, polled in self.polled)
+        self.polled.clear()
+
+    def flip(self, shown, now):
+        # shown is the tick time the frame was drawn at, interpolation included
+        if self.ticked:
+            self.samples.extend((pressed, polled, now) for pressed, polled, tick in self.ticked if tick <= shown)
+            self.ticked = [item for item in self.ticked if item[2] > shown]
+
+    def discard(self):
+        # Presses whose run ended before they were shown
+        self.polled.clear()
+        self.ticked.clear()
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        pressed, polled, shown = np.array(self.samples).T * 1000
+        stats = {}
+        for name, ms in (('to_poll', polled - pressed), ('to_flip', shown - polled), ('total', shown - pressed)):
+            stats[name] = {'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                           'p95': float(np.percentile(ms, 95)), 'p99': float(np.percentile(ms, 99))}
+        return stats
+
+    def report(self, title):
+        stats = self.summary()
+        if not stats:
+            return f"{title}: no jump presses shown"
+        lines = [f"{title}: {len(self.samples)} jump presses",
+                 f"  {'ms':<14} {'mean':>6} {'p50':>6} {'p95':>6} {'p99':>6}"]
+        for name, label in (('to_poll', 'press to poll'), ('to_flip', 'poll to flip'), ('total', 'press to flip')):
+            row = stats[name]
+            lines.append(f"  {label:<14} {row['mean']:>6.1f} {row['p50']:>6.1f} {row['p95']:>6.1f} {row['p99']:>6.1f}")
+        return '\n'.join(lines)
+
 class Button:
     def __init__(self, x, y, width, height, text_key, action, game):
         self.rect = pygame.Rect(x, y, width, height)
@@ -37,26 +504,40 @@ class Button:
         self.action = action
         self.game = game
 
-    def draw(self):
-        pygame.draw.rect(self.game.screen, NEON_PINK, self.rect, border_radius=10)
+    def label(self):
         if self.text_key == 'level':
-            text_str = self.game.texts[self.game.language]['level'] + str(self.game.selected_level)
-        elif self.text_key == 'change_char':
-            text_str = self.game.texts[self.game.language]['change_char'] + f" ({self.game.selected_shape})"
-        else:
-            text_str = self.game.texts[self.game.language][self.text_key]
-        text = self.game.font_small.render(text_str, True, BLACK)
-        text_rect = text.get_rect(center=self.rect.center)
-        self.game.screen.blit(text, text_rect)
+            return self.game.texts[self.game.language]['level'] + str(self.game.selected_level)
+        if self.text_key == 'change_char':
+            return self.game.texts[self.game.language]['change_char'] + f" ({self.game.selected_shape})"
+        return self.game.texts[self.game.language][self.text_key]
+
+    def render(self, scale=1.0):
+        # Face and label baked together for the menu layer; long labels
+        # overhang the face, so the surface covers both
+        face = pygame.Rect([round(v * scale) for v in self.rect])
+        text = text_cache.render(self.game.font_small, self.label(), True, BLACK)
+        text_rect = text.get_rect(center=face.center)
+        bounds = face.union(text_rect)
+        surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        pygame.draw.rect(surface, NEON_PINK, face.move(-bounds.x, -bounds.y), border_radius=round(10 * scale))
+        surface.blit(text, text_rect.move(-bounds.x, -bounds.y))
+        return surface, bounds.topleft
 
     def handle_click(self, pos):
         if self.rect.collidepoint(pos):
             self.action()
 
 class Player:
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'velocity_y', 'jump_power', 'gravity',
+                 'is_jumping', 'speed', 'invincible', 'invincible_timer', 'color', 'trail_particles', 'shape')
+
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
+        self.trail_particles = ParticleSystem(TRAIL_CAPACITY)
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
         self.width = 40
         self.height = 60
         self.velocity_y = 0
@@ -67,7 +548,7 @@ class Player:
         self.invincible = False
         self.invincible_timer = 0
         self.color = NEON_BLUE
-        self.trail_particles = []
+        self.trail_particles.clear()
         self.shape = 'rect'
 
     def move(self, direction):
@@ -98,50 +579,43 @@ class Player:
             if self.invincible_timer <= 0:
                 self.invincible = False
 
-        # Add trail particles when moving
-        if (pygame.key.get_pressed()[pygame.K_LEFT] or 
-            pygame.key.get_pressed()[pygame.K_RIGHT]) and random.random() < 0.3:
-            self.trail_particles.append({
-                'x': self.x + self.width // 2,
-                'y': self.y + self.height,
-                'size': random.randint(2, 5),
-                'life': 20
-            })
-
-        # Update trail particles
-        for particle in self.trail_particles[:]:
-            particle['life'] -= 1
-            if particle['life'] <= 0:
-                self.trail_particles.remove(particle)
-
-    def draw(self, screen):
-        # Draw trail particles
-        for particle in self.trail_particles:
-            alpha = min(255, particle['life'] * 12)
-            color = (*NEON_BLUE, alpha) if len(NEON_BLUE) == 3 else NEON_BLUE
-            pygame.draw.circle(screen, color, (int(particle['x']), int(particle['y'])), particle['size'])
+    def update_trail(self, moving, rng):
+        # Trail particles are cosmetic, so they are driven by the renderer
+        if moving and rng.random() < 0.3:
+            self.trail_particles.emit(self.x + self.width // 2, self.y + self.height, rng.integers(2, 6), TRAIL_LIFE)
+        self.trail_particles.update()
+
+    def draw(self, screen, alpha=1.0, scale=1.0):
+        # Draw trail particles, fading out with their remaining life
+        trail = self.trail_particles
+        trail.draw(screen, NEON_BLUE, np.minimum(255, trail.life[:trail.count] * 12), scale)
 
         # Flash effect when invincible
         flash_color = NEON_GREEN if self.invincible and pygame.time.get_ticks() % 200 < 100 else self.color
+        # alpha is how far rendering is between the previous tick and this one
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        screen.blit(sprites.player(self.shape, flash_color), (x * scale, y * scale))
 
+    def draw_shape(self, surface, x, y, color):
         # Draw based on shape
         if self.shape == 'rect':
-            pygame.draw.rect(screen, flash_color, (self.x, self.y, self.width, self.height), border_radius=8)
+            pygame.draw.rect(surface, color, (x, y, self.width, self.height), border_radius=8)
             # Add details
-            pygame.draw.rect(screen, NEON_PINK, (self.x + 5, self.y + 5, self.width - 10, 10), border_radius=4)
-            pygame.draw.rect(screen, CYBER_YELLOW, (self.x + 15, self.y + 20, 10, 20), border_radius=2)
+            pygame.draw.rect(surface, NEON_PINK, (x + 5, y + 5, self.width - 10, 10), border_radius=4)
+            pygame.draw.rect(surface, CYBER_YELLOW, (x + 15, y + 20, 10, 20), border_radius=2)
         elif self.shape == 'circle':
             radius = min(self.width, self.height) // 2
-            center = (self.x + self.width // 2, self.y + self.height // 2)
-            pygame.draw.circle(screen, flash_color, center, radius)
+            center = (x + self.width // 2, y + self.height // 2)
+            pygame.draw.circle(surface, color, center, radius)
         elif self.shape == 'ellipse':
-            pygame.draw.ellipse(screen, flash_color, (self.x, self.y, self.width, self.height))
+            pygame.draw.ellipse(surface, color, (x, y, self.width, self.height))
         elif self.shape == 'triangle':
-            points = [(self.x, self.y + self.height), (self.x + self.width, self.y + self.height), (self.x + self.width // 2, self.y)]
-            pygame.draw.polygon(screen, flash_color, points)
+            points = [(x, y + self.height), (x + self.width, y + self.height), (x + self.width // 2, y)]
+            pygame.draw.polygon(surface, color, points)
         elif self.shape == 'square':
             size = min(self.width, self.height)
-            pygame.draw.rect(screen, flash_color, (self.x, self.y + (self.height - size), size, size))
+            pygame.draw.rect(surface, color, (x, y + (self.height - size), size, size))
 
     def get_rect(self):
         return pygame.Rect(self.x, self.y, self.width, self.height)
@@ -151,67 +625,1158 @@ class Player:
         self.invincible_timer = 300  # 5 seconds at 60 FPS
 
 class Obstacle:
+    __slots__ = ('x', 'y', 'prev_x', 'type', 'speed', 'width', 'height', 'color')
+
     def __init__(self, x, y, obstacle_type):
-        self.x = x
+        self.reset(x, y, obstacle_type)
+
+    def reset(self, x, y, obstacle_type):
+        self.x = self.prev_x = x
         self.y = y
         self.type = obstacle_type
         self.speed = 5
-
-        # Set color based on type
-        if obstacle_type == "red":
-            self.width = 50
-            self.height = 50
-            self.color = RED
-        elif obstacle_type == "green":
-            self.width = 40
-            self.height = 40
-            self.color = NEON_GREEN
-        elif obstacle_type == "purple":
-            self.width = 40
-            self.height = 40
-            self.color = NEON_PURPLE
-        else:  # neutral
-            self.width = 40
-            self.height = 40
-            self.color = (100, 100, 100)  # Gray
+        self.width, self.height, self.color, _ = OBSTACLE_SPECS[obstacle_type]
 
     def update(self, game_speed):
+        self.prev_x = self.x
         self.x -= self.speed + game_speed
 
-    def draw(self, screen):
+    def draw(self, screen, alpha=1.0, scale=1.0):
+        screen.blit(sprites.obstacle(self.type), ((self.prev_x + (self.x - self.prev_x) * alpha) * scale, self.y * scale))
+
+    def draw_shape(self, surface, x, y):
         # Draw different shapes based on type
         if self.type == "red":
-            pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height), border_radius=10)
-            pygame.draw.polygon(screen, BLACK, [
-                (self.x + 10, self.y + 15),
-                (self.x + self.width - 10, self.y + 15),
-                (self.x + self.width // 2, self.y + self.height - 10)
+            pygame.draw.rect(surface, self.color, (x, y, self.width, self.height), border_radius=10)
+            pygame.draw.polygon(surface, BLACK, [
+                (x + 10, y + 15),
+                (x + self.width - 10, y + 15),
+                (x + self.width // 2, y + self.height - 10)
             ])
         elif self.type == "green":
-            pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height), border_radius=15)
-            pygame.draw.rect(screen, BLACK, (self.x + 5, self.y + 5, self.width - 10, self.height - 10), border_radius=10)
-            pygame.draw.rect(screen, self.color, (self.x + 15, self.y + 10, self.width - 30, self.height - 20), border_radius=5)
+            pygame.draw.rect(surface, self.color, (x, y, self.width, self.height), border_radius=15)
+            pygame.draw.rect(surface, BLACK, (x + 5, y + 5, self.width - 10, self.height - 10), border_radius=10)
+            pygame.draw.rect(surface, self.color, (x + 15, y + 10, self.width - 30, self.height - 20), border_radius=5)
         elif self.type == "purple":
-            pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height), border_radius=15)
-            pygame.draw.rect(screen, BLACK, (self.x + 5, self.y + 5, self.width - 10, self.height - 10), border_radius=10)
-            font = pygame.font.SysFont('arial', 20, bold=True)
-            text = font.render("X2", True, self.color)
-            text_rect = text.get_rect(center=(self.x + self.width // 2, self.y + self.height // 2))
-            screen.blit(text, text_rect)
+            pygame.draw.rect(surface, self.color, (x, y, self.width, self.height), border_radius=15)
+            pygame.draw.rect(surface, BLACK, (x + 5, y + 5, self.width - 10, self.height - 10), border_radius=10)
+            text = text_cache.render(get_font('arial', 20, bold=True), "X2", True, self.color)
+            text_rect = text.get_rect(center=(x + self.width // 2, y + self.height // 2))
+            surface.blit(text, text_rect)
         else:
-            pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
+            pygame.draw.rect(surface, self.color, (x, y, self.width, self.height))
 
     def get_rect(self):
         return pygame.Rect(self.x, self.y, self.width, self.height)
 
-class Game:
+class SpriteAtlas:
+    # Obstacles and player shapes only ever change position, so each look is
+    # drawn once with the primitive code above and blitted from then on.
+    # At whole-pixel x a sprite matches the primitives exactly. At fractional
+    # x it does not: the primitives rounded each part on its own (rects
+    # truncate, polygons floor, the purple label's centre rounds), so parts
+    # could land a pixel apart, while a sprite keeps them together. That is
+    # up to about 100 pixels of difference per obstacle, all cosmetic
+    def __init__(self):
+        self.obstacles = {}
+        self.players = {}
+        self.ghosts = {}
+        self.scale = 1.0
+
+    def set_scale(self, scale):
+        # Sprites are baked at the render scale, so a change rebakes them
+        if scale != self.scale:
+            self.scale = scale
+            self.obstacles.clear()
+            self.players.clear()
+            self.ghosts.clear()
+
+    def build(self, obstacle_types, shapes, colors):
+        for obstacle_type in obstacle_types:
+            self.obstacle(obstacle_type)
+        for shape in shapes:
+            for color in colors:
+                self.player(shape, color)
+
+    def bake(self, width, height, draw):
+        # One spare pixel each way, polygons include their far edge
+        surface = pygame.Surface((width + 1, height + 1), pygame.SRCALPHA)
+        draw(surface)
+        if self.scale != 1.0:
+            surface = pygame.transform.smoothscale(surface, (math.ceil((width + 1) * self.scale), math.ceil((height + 1) * self.scale)))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+
+    def obstacle(self, obstacle_type):
+        sprite = self.obstacles.get(obstacle_type)
+        if sprite is None:
+            template = Obstacle(0, 0, obstacle_type)
+            sprite = self.bake(template.width, template.height, lambda surface: template.draw_shape(surface, 0, 0))
+            self.obstacles[obstacle_type] = sprite
+        return sprite
+
+    def player(self, shape, color):
+        sprite = self.players.get((shape, color))
+        if sprite is None:
+            template = Player(0, 0)
+            template.shape = shape
+            sprite = self.bake(template.width, template.height, lambda surface: template.draw_shape(surface, 0, 0, color))
+            self.players[(shape, color)] = sprite
+        return sprite
+
+    def ghost(self, shape):
+        # The player sprite tinted once and flattened to a colorkey plus
+        # surface alpha: RLE-encoded, a crowd of them blits about 3x faster
+        # than with per-pixel alpha
+        sprite = self.ghosts.get(shape)
+        if sprite is None:
+            player = self.player(shape, NEON_BLUE)
+            sprite = pygame.Surface(player.get_size())
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert()
+            sprite.blit(player, (0, 0))
+            sprite.fill(GHOST_TINT, special_flags=pygame.BLEND_RGB_MULT)
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            sprite.set_alpha(GHOST_ALPHA, pygame.RLEACCEL)
+            self.ghosts[shape] = sprite
+        return sprite
+
+sprites = SpriteAtlas()
+
+class ObstaclePool:
+    # Culled and collected obstacles are kept for reuse so steady play
+    # allocates nothing per spawn
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.free = []
+        self.live = 0
+        self.high_water = 0
+
+    def acquire(self, x, y, obstacle_type):
+        if self.free:
+            obstacle = self.free.pop()
+            obstacle.reset(x, y, obstacle_type)
+        else:
+            obstacle = Obstacle(x, y, obstacle_type)
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return obstacle
+
+    def release(self, obstacle):
+        self.live -= 1
+        self.free.append(obstacle)
+
+    def stats(self):
+        return {'live': self.live, 'free': len(self.free), 'high_water': self.high_water}
+
+class ObstacleQueue(deque):
+    # Obstacles spawn at the right edge and all scroll left at the same speed,
+    # so spawn order is x order: offscreen ones are always at the left end and
+    # only a short run of the queue can overlap the player horizontally
+    def __init__(self, obstacles=(), pool=None):
+        super().__init__(obstacles)
+        self.pool = pool
+        self.probe = pygame.Rect(0, 0, 0, 0)
+
+    def spawn(self, x, y, obstacle_type):
+        self.append(self.pool.acquire(x, y, obstacle_type))
+
+    def discard(self, obstacle):
+        self.remove(obstacle)
+        if self.pool is not None:
+            self.pool.release(obstacle)
+
+    def discard_all(self):
+        while self:
+            obstacle = self.pop()
+            if self.pool is not None:
+                self.pool.release(obstacle)
+
+    def cull_offscreen(self):
+        culled = 0
+        while self and self[0].x < -self[0].width:
+            obstacle = self.popleft()
+            if self.pool is not None:
+                self.pool.release(obstacle)
+            culled += 1
+        return culled
+
+    def overlapping(self, rect):
+        # Broad phase on the x-span (a pixel of slack for Rect truncation),
+        # exact test with one reused Rect on the few candidates
+        hits = []
+        probe = self.probe
+        for obstacle in self:
+            if obstacle.x > rect.right + 1:
+                break
+            if obstacle.x + obstacle.width < rect.left - 1:
+                continue
+            probe.update(obstacle.x, obstacle.y, obstacle.width, obstacle.height)
+            if rect.colliderect(probe):
+                hits.append(obstacle)
+        return hits
+
+class LevelSchedule:
+    # What spawns, in order, for a (level, seed) pair, so a level can be
+    # shared as two numbers. Entries are drawn from the seed exactly as
+    # spawn_obstacle used to draw them, a chunk at a time as the run reaches
+    # them, so old seeds and replays still play the same. The level sets the
+    # pace (when an entry spawns still follows the game speed) and is kept
+    # for checking and the disk cache
+    MAGIC = b'CRLV'
+    VERSION = 2  # 1 stored screen passes as verified_ticks
+    HEADER = struct.Struct('<4sBQBII')
+
+    def __init__(self, level, seed, types=b'', heights=b'', verified_ticks=0):
+        self.level = level
+        self.seed = seed
+        self.types = bytearray(types)  # index into OBSTACLE_TYPES
+        self.heights = bytearray(heights)  # y - SCHEDULE_Y_BASE
+        self.verified_ticks = verified_ticks  # how long a real run survived it (confirm_schedule)
+        self.rng = None
+
+    def __len__(self):
+        return len(self.types)
+
+    @staticmethod
+    def draw(rng):
+        index = rng.choices(range(len(OBSTACLE_TYPES)), cum_weights=SPAWN_CUM_WEIGHTS)[0]
+        low, high = OBSTACLE_SPECS[OBSTACLE_TYPES[index]][3]
+        return index, rng.randint(low, high) if low != high else low
+
+    def extend(self, count=SCHEDULE_CHUNK):
+        rng = self.rng
+        if rng is None:
+            # New, or loaded from disk: catch up with the entries already held
+            rng = self.rng = random.Random(self.seed)
+            for _ in range(len(self.types)):
+                self.draw(rng)
+        for _ in range(count):
+            index, y = self.draw(rng)
+            self.types.append(index)
+            self.heights.append(y - SCHEDULE_Y_BASE)
+
+    def entry(self, index):
+        while index >= len(self.types):
+            self.extend()
+        return OBSTACLE_TYPES[self.types[index]], SCHEDULE_Y_BASE + self.heights[index]
+
+    @staticmethod
+    def path(level, seed, directory=LEVEL_CACHE_DIR):
+        return os.path.join(directory, f"{level}-{seed}.crl")
+
+    def save(self, directory=LEVEL_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = self.path(self.level, self.seed, directory)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.level, self.verified_ticks, len(self)))
+            f.write(self.types)
+            f.write(self.heights)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, level, seed, directory=LEVEL_CACHE_DIR):
+        # None when the level isn't cached; a bad file is treated the same
+        try:
+            with open(cls.path(level, seed, directory), 'rb') as f:
+                data = f.read()
+            magic, version, seed, level, verified_ticks, count = cls.HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        start = cls.HEADER.size
+        if magic != cls.MAGIC or version != cls.VERSION or len(data) != start + 2 * count:
+            return None
+        return cls(level, seed, data[start:start + count], data[start + count:], verified_ticks)
+
+SimState = namedtuple('SimState', ['tick', 'score', 'multiplier', 'game_speed', 'player_x', 'player_y', 'invincible', 'game_over'])
+# Everything Simulation.step reads. The schedule is shared, not copied, with
+# spawned marking how far into it the run is. player is (x, y, velocity_y,
+# is_jumping, invincible, invincible_timer) and obstacles a tuple of (x, y, type)
+SimSnapshot = namedtuple('SimSnapshot', ['level', 'tick', 'score', 'game_speed', 'obstacle_timer', 'multiplier', 'multiplier_timer',
+                                         'game_over', 'powerups', 'death_cause', 'schedule', 'spawned', 'player', 'obstacles'])
+
+class Simulation:
+    # The game rules on their own: no display, no input polling and a seeded
+    # level schedule, so a run can be stepped as fast as the CPU allows and
+    # reproduced
+    def __init__(self, level=1, shape='rect', seed=None):
+        self.level = level
+        self.shape = shape
+        self.player = Player(100, SCREEN_HEIGHT - 200)
+        self.player_rect = pygame.Rect(0, 0, 0, 0)
+        self.pool = ObstaclePool()
+        self.obstacles = ObstacleQueue(pool=self.pool)
+        self.reset(seed)
+
+    def reset(self, seed=None, schedule=None):
+        # Reuses the player and returns every obstacle to the pool. schedule
+        # is a cached LevelSchedule for this seed, if there is one
+        self.schedule = schedule if schedule is not None else LevelSchedule(self.level, seed)
+        self.seed = self.schedule.seed
+        self.spawned = 0
+        self.player.reset(100, SCREEN_HEIGHT - 200)
+        self.player.shape = self.shape
+        self.obstacles.discard_all()
+        self.score = 0
+        self.starting_speed = (self.level - 1) * 0.5
+        self.game_speed = self.starting_speed
+        self.obstacle_timer = 0
+        self.multiplier = 1
+        self.multiplier_timer = 0
+        self.tick = 0
+        self.game_over = False
+        self.powerups = 0
+        self.death_cause = None
+
+    def step(self, actions=0):
+        if self.game_over:
+            return self.state()
+
+        player = self.player
+        player.prev_x = player.x
+        player.prev_y = player.y
+        if actions & ACTION_JUMP:
+            self.player.jump()
+        if actions & ACTION_LEFT:
+            self.player.move("left")
+        if actions & ACTION_RIGHT:
+            self.player.move("right")
+
+        self.player.update()
+        for obstacle in self.obstacles:
+            obstacle.update(self.game_speed)
+        for _ in range(self.obstacles.cull_offscreen()):
+            self.score += 10 * self.multiplier
+        self.obstacle_timer += 1
+        level_factor = (self.level - 1) * 2
+        if self.obstacle_timer > 60 - min(50, self.game_speed * 5 + level_factor):
+            self.spawn_obstacle()
+            self.obstacle_timer = 0
+        self.check_collisions()
+        self.update_multiplier()
+        self.score += 0.1 * self.multiplier
+        self.game_speed = self.starting_speed + min(10, self.score / 1000)
+        self.tick += 1
+        return self.state()
+
+    def state(self):
+        return SimState(self.tick, self.score, self.multiplier, self.game_speed,
+                        self.player.x, self.player.y, self.player.invincible, self.game_over)
+
+    def snapshot(self):
+        # Trail particles and the previous-tick render positions are left out;
+        # everything else is derived from the level, the type or the constants
+        player = self.player
+        return SimSnapshot(self.level, self.tick, self.score, self.game_speed, self.obstacle_timer, self.multiplier,
+                           self.multiplier_timer, self.game_over, self.powerups, self.death_cause, self.schedule, self.spawned,
+                           (player.x, player.y, player.velocity_y, player.is_jumping, player.invincible, player.invincible_timer),
+                           tuple([(obstacle.x, obstacle.y, obstacle.type) for obstacle in self.obstacles]))
+
+    def restore(self, snapshot):
+        self.level = snapshot.level
+        self.starting_speed = (self.level - 1) * 0.5
+        self.tick = snapshot.tick
+        self.score = snapshot.score
+        self.game_speed = snapshot.game_speed
+        self.obstacle_timer = snapshot.obstacle_timer
+        self.multiplier = snapshot.multiplier
+        self.multiplier_timer = snapshot.multiplier_timer
+        self.game_over = snapshot.game_over
+        self.powerups = snapshot.powerups
+        self.death_cause = snapshot.death_cause
+        self.schedule = snapshot.schedule
+        self.spawned = snapshot.spawned
+        player = self.player
+        player.x, player.y, player.velocity_y, player.is_jumping, player.invincible, player.invincible_timer = snapshot.player
+        player.prev_x = player.x
+        player.prev_y = player.y
+        obstacles = self.obstacles
+        obstacles.discard_all()
+        for x, y, obstacle_type in snapshot.obstacles:
+            obstacles.spawn(x, y, obstacle_type)
+
+    def run(self, policy, max_ticks):
+        # Step uncapped until the run ends; policy(sim) returns action bits
+        while not self.game_over and self.tick < max_ticks:
+            self.step(policy(self))
+        return self.state()
+
+    def spawn_obstacle(self):
+        obstacle_type, y_pos = self.schedule.entry(self.spawned)
+        self.spawned += 1
+        self.obstacles.spawn(SCREEN_WIDTH, y_pos, obstacle_type)
+
+    def check_collisions(self):
+        player = self.player
+        self.player_rect.update(player.x, player.y, player.width, player.height)
+
+        for obstacle in self.obstacles.overlapping(self.player_rect):
+            if obstacle.type == "red":
+                if not self.player.invincible:
+                    self.game_over = True
+                    self.death_cause = obstacle.type
+                else:
+                    self.obstacles.discard(obstacle)
+            elif obstacle.type == "green":
+                self.player.activate_invincibility()
+                self.obstacles.discard(obstacle)
+                self.powerups += 1
+            elif obstacle.type == "purple":
+                self.multiplier = 2
+                self.multiplier_timer = 300
+                self.obstacles.discard(obstacle)
+                self.powerups += 1
+            else:
+                self.obstacles.discard(obstacle)
+
+    def update_multiplier(self):
+        if self.multiplier_timer > 0:
+            self.multiplier_timer -= 1
+            if self.multiplier_timer <= 0:
+                self.multiplier = 1
+
+class Autopilot:
+    # Beam search over held actions. From a snapshot of the live run, every
+    # line is extended by each action held for `hold` ticks, the `beam`
+    # best survivors are kept, and after `depth` rounds the first action of
+    # the best line is played for `hold` ticks. The search steps a private
+    # Simulation, so the run being played is never touched. The snapshot
+    # shares the run's LevelSchedule, so the lookahead sees the real upcoming
+    # spawns: a cheating heuristic for probing difficulty rather than a fair
+    # player, and with a narrow beam not a proof that a level is unsurvivable
+    ACTIONS = (0, ACTION_LEFT, ACTION_RIGHT, ACTION_JUMP, ACTION_JUMP | ACTION_LEFT, ACTION_JUMP | ACTION_RIGHT)
+
+    def __init__(self, beam=4, depth=12, hold=5, actions=ACTIONS):
+        self.beam = beam
+        self.depth = depth
+        self.hold = hold
+        self.actions = actions
+        self.scratch = Simulation()
+        self.plan = deque()
+        self.branches = 0
+
+    def __call__(self, sim):
+        if not self.plan:
+            self.plan.extend([self.search(sim)] * self.hold)
+        return self.plan.popleft()
+
+    def reset(self):
+        self.plan.clear()
+
+    def evaluate(self, sim):
+        # Score first; keeping away from the edges leaves room to dodge
+        return sim.score - abs(sim.player.x - SCREEN_WIDTH * 0.3) * 0.01
+
+    def search(self, sim):
+        scratch = self.scratch
+        hold = self.hold
+        lines = [(None, sim.snapshot())]
+        best = 0
+        for _ in range(self.depth):
+            candidates = []
+            longest = (-1, 0)  # (tick of death, first action) of the longest dead line
+            for first, snapshot in lines:
+                for action in self.actions:
+                    scratch.restore(snapshot)
+                    for _ in range(hold):
+                        scratch.step(action)
+                    self.branches += 1
+                    first_action = action if first is None else first
+                    if not scratch.game_over:
+                        candidates.append((self.evaluate(scratch), first_action, scratch.snapshot()))
+                    elif scratch.tick > longest[0]:
+                        longest = (scratch.tick, first_action)
+            if not candidates:
+                # Every line dies: play the one that lasted longest
+                return longest[1]
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            lines = [(first, snapshot) for _, first, snapshot in candidates[:self.beam]]
+            best = lines[0][0]
+        return best
+
+class BatchSimulation:
+    # N independent runs in NumPy arrays, all advanced by one vectorized step.
+    # Rules mirror Simulation.step; the RNG is one numpy Generator for the batch.
+    # Gym-style: reset() -> obs, step(actions) -> (obs, reward, done, info)
+    NEAREST_OBSTACLES = 3
+
+    def __init__(self, n, levels=1, seed=None, max_obstacles=16, auto_reset=False):
+        # observe() partitions out the nearest obstacles, which needs more slots than that
+        if max_obstacles <= self.NEAREST_OBSTACLES:
+            raise ValueError(f"max_obstacles must be more than {self.NEAREST_OBSTACLES}")
+        self.n = n
+        self.max_obstacles = max_obstacles
+        self.auto_reset = auto_reset
+        self.levels = np.broadcast_to(np.asarray(levels, dtype=np.int32), (n,)).copy()
+
+        template = Player(0, 0)
+        self.player_width = template.width
+        self.player_height = template.height
+        self.player_speed = template.speed
+        self.jump_power = template.jump_power
+        self.gravity = template.gravity
+        self.ground_y = SCREEN_HEIGHT - template.height - 50
+        self.type_width = np.array([OBSTACLE_SPECS[t][0] for t in OBSTACLE_TYPES], dtype=np.int32)
+        self.type_height = np.array([OBSTACLE_SPECS[t][1] for t in OBSTACLE_TYPES], dtype=np.int32)
+        self.obstacle_speed = Obstacle(0, 0, "red").speed
+        self.type_y_low = np.array([OBSTACLE_SPECS[t][3][0] for t in OBSTACLE_TYPES], dtype=np.int32)
+        self.type_y_high = np.array([OBSTACLE_SPECS[t][3][1] for t in OBSTACLE_TYPES], dtype=np.int32)
+        self.spawn_weights = np.array(SPAWN_WEIGHTS)
+
+        shape = (n, max_obstacles)
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.velocity_y = np.zeros(n)
+        self.is_jumping = np.zeros(n, dtype=bool)
+        self.invincible_timer = np.zeros(n, dtype=np.int32)
+        self.score = np.zeros(n)
+        self.starting_speed = (self.levels - 1) * 0.5
+        self.game_speed = np.zeros(n)
+        self.obstacle_timer = np.zeros(n, dtype=np.int32)
+        self.multiplier = np.ones(n, dtype=np.int32)
+        self.multiplier_timer = np.zeros(n, dtype=np.int32)
+        self.powerups = np.zeros(n, dtype=np.int32)
+        self.tick = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.obstacle_x = np.zeros(shape)
+        self.obstacle_y = np.zeros(shape)
+        self.obstacle_type = np.zeros(shape, dtype=np.int8)
+        self.obstacle_width = np.zeros(shape)
+        self.obstacle_height = np.zeros(shape)
+        self.obstacle_alive = np.zeros(shape, dtype=bool)
+        self.obstacle_order = np.zeros(shape, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.reset_where(np.ones(self.n, dtype=bool))
+        return self.observe()
+
+    def reset_where(self, mask):
+        self.x[mask] = 100
+        self.y[mask] = SCREEN_HEIGHT - 200
+        self.velocity_y[mask] = 0
+        self.is_jumping[mask] = False
+        self.invincible_timer[mask] = 0
+        self.score[mask] = 0
+        self.game_speed[mask] = self.starting_speed[mask]
+        self.obstacle_timer[mask] = 0
+        self.multiplier[mask] = 1
+        self.multiplier_timer[mask] = 0
+        self.powerups[mask] = 0
+        self.tick[mask] = 0
+        self.done[mask] = False
+        self.obstacle_alive[mask] = False
+
+    def step(self, actions):
+        actions = np.broadcast_to(np.asarray(actions, dtype=np.int32), (self.n,))
+        active = ~self.done
+        score_before = self.score.copy()
+
+        # Input
+        jump = active & (actions & ACTION_JUMP != 0) & ~self.is_jumping
+        self.velocity_y[jump] = self.jump_power
+        self.is_jumping |= jump
+        self.x -= self.player_speed * (active & (actions & ACTION_LEFT != 0) & (self.x > 0))
+        self.x += self.player_speed * (active & (actions & ACTION_RIGHT != 0) & (self.x < SCREEN_WIDTH - self.player_width))
+
+        # Player physics and invincibility
+        self.velocity_y[active] += self.gravity
+        self.y[active] += self.velocity_y[active]
+        landed = active & (self.y >= self.ground_y)
+        self.y[landed] = self.ground_y
+        self.velocity_y[landed] = 0
+        self.is_jumping[landed] = False
+        self.invincible_timer[active & (self.invincible_timer > 0)] -= 1
+
+        # Scroll obstacles and score the ones that left the screen
+        # (free slots drift too, which is harmless; finished runs stand still)
+        self.obstacle_x -= ((self.obstacle_speed + self.game_speed) * active)[:, None]
+        culled = self.obstacle_alive & (self.obstacle_x < -self.obstacle_width)
+        self.obstacle_alive &= ~culled
+        self.score += 10 * self.multiplier * culled.sum(axis=1)
+
+        # Spawning, with the same weights and heights as spawn_obstacle
+        self.obstacle_timer += active
+        level_factor = (self.levels - 1) * 2
+        spawn = active & (self.obstacle_timer > 60 - np.minimum(50, self.game_speed * 5 + level_factor))
+        self.spawn_obstacles(np.flatnonzero(spawn))
+        self.obstacle_timer[spawn] = 0
+
+        self.check_collisions(active)
+
+        # Multiplier, score and speed
+        counting = active & (self.multiplier_timer > 0)
+        self.multiplier_timer[counting] -= 1
+        self.multiplier[counting & (self.multiplier_timer <= 0)] = 1
+        self.score[active] += 0.1 * self.multiplier[active]
+        self.game_speed[active] = self.starting_speed[active] + np.minimum(10, self.score[active] / 1000)
+        self.tick += active
+
+        reward = self.score - score_before
+        done = self.done.copy()
+        info = {'score': self.score.copy(), 'ticks': self.tick.copy(), 'powerups': self.powerups.copy()}
+        if self.auto_reset and done.any():
+            self.reset_where(done)
+        return self.observe(), reward, done, info
+
+    def spawn_obstacles(self, games):
+        if len(games) == 0:
+            return
+        types = self.rng.choice(len(OBSTACLE_TYPES), size=len(games), p=self.spawn_weights)
+        low = self.type_y_low[types]
+        y = low + self.rng.integers(0, self.type_y_high[types] - low + 1)
+        slots = np.argmin(self.obstacle_alive[games], axis=1)
+        free = ~self.obstacle_alive[games, slots]
+        games, slots = games[free], slots[free]
+        self.obstacle_x[games, slots] = SCREEN_WIDTH
+        self.obstacle_y[games, slots] = y[free]
+        self.obstacle_type[games, slots] = types[free]
+        self.obstacle_width[games, slots] = self.type_width[types[free]]
+        self.obstacle_height[games, slots] = self.type_height[types[free]]
+        self.obstacle_alive[games, slots] = True
+        self.obstacle_order[games, slots] = self.tick[games]
+
+    def check_collisions(self, active):
+        # Broad phase on the float x-span with a pixel of slack, then the exact
+        # pygame.Rect test (truncated coordinates) on the few candidates left
+        x = self.x[:, None]
+        candidates = (self.obstacle_alive & active[:, None]
+                      & (self.obstacle_x > x - self.obstacle_width - 1)
+                      & (self.obstacle_x < x + self.player_width + 1))
+        games, slots = np.nonzero(candidates)
+        if len(games) == 0:
+            return
+        px = np.trunc(self.x[games])
+        py = np.trunc(self.y[games])
+        ox = np.trunc(self.obstacle_x[games, slots])
+        oy = self.obstacle_y[games, slots]
+        overlap = ((px < ox + self.obstacle_width[games, slots]) & (px + self.player_width > ox)
+                   & (py < oy + self.obstacle_height[games, slots]) & (py + self.player_height > oy))
+        if not overlap.any():
+            return
+        hit = np.zeros_like(self.obstacle_alive)
+        hit[games[overlap], slots[overlap]] = True
+
+        # A green pickup only protects against red obstacles behind it in the list
+        types = self.obstacle_type
+        green = hit & (types == 1)
+        purple = hit & (types == 2)
+        red = hit & (types == 0)
+        first_green = np.where(green, self.obstacle_order, np.iinfo(np.int64).max).min(axis=1)
+        protected = (self.invincible_timer > 0)[:, None] | (first_green[:, None] < self.obstacle_order)
+        fatal = red & ~protected
+        self.done |= fatal.any(axis=1)
+
+        self.obstacle_alive &= ~(hit & ~fatal)
+        got_green = green.any(axis=1)
+        got_purple = purple.any(axis=1)
+        self.invincible_timer[got_green] = 300
+        self.multiplier[got_purple] = 2
+        self.multiplier_timer[got_purple] = 300
+        self.powerups += green.sum(axis=1) + purple.sum(axis=1)
+
+    def observe(self):
+        # Player state followed by the nearest obstacles ahead: (dx, y, type)
+        ahead = self.obstacle_alive & (self.obstacle_x + self.obstacle_width >= self.x[:, None])
+        distance = np.where(ahead, self.obstacle_x, np.inf)
+        nearest = np.argpartition(distance, self.NEAREST_OBSTACLES, axis=1)[:, :self.NEAREST_OBSTACLES]
+        rows = np.arange(self.n)[:, None]
+        nearest = np.take_along_axis(nearest, np.argsort(distance[rows, nearest], axis=1), axis=1)
+        present = ahead[rows, nearest]
+        obstacles = np.stack([
+            np.where(present, self.obstacle_x[rows, nearest] - self.x[:, None], SCREEN_WIDTH),
+            np.where(present, self.obstacle_y[rows, nearest], 0),
+            np.where(present, self.obstacle_type[rows, nearest], -1),
+        ], axis=2).reshape(self.n, -1)
+        player = np.stack([self.x, self.y, self.velocity_y, self.invincible_timer,
+                           self.multiplier, self.game_speed], axis=1)
+        return np.concatenate([player, obstacles], axis=1).astype(np.float32)
+
+def reserve_run_path(directory, seed, extension):
+    # run-<date>-<time>-<seed>, then -2, -3... for runs ending in the same
+    # second. The file is created here, so no other run can take the name
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"run-{time.strftime('%Y%m%d-%H%M%S')}-{seed}")
+    path = stem + extension
+    suffix = 2
+    while True:
+        try:
+            open(path, 'xb').close()
+            return path
+        except FileExistsError:
+            path = f"{stem}-{suffix}{extension}"
+            suffix += 1
+
+class Replay:
+    # Seed, level, shape and one input byte per tick (ACTION_* | REPLAY_PAUSE),
+    # zlib-compressed. Held keys make long identical runs, so a 10 minute run
+    # is typically a few KB. The claimed final score is kept for validation
+    MAGIC = b'CRRP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBIBBId')
+
+    def __init__(self, seed, level, shape, frames=None, ticks=0, score=0.0):
+        self.seed = seed
+        self.level = level
+        self.shape = shape
+        self.frames = bytearray(frames or b'')
+        self.ticks = ticks
+        self.score = score
+
+    def record(self, bits):
+        self.frames.append(bits)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.level,
+                                     self.shape, self.ticks, self.score))
+            f.write(zlib.compress(bytes(self.frames), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, seed, level, shape, ticks, score = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} CyberRunner replay")
+        return cls(seed, level, shape, zlib.decompress(data[cls.HEADER.size:]), ticks, score)
+
+    def simulate(self, shapes):
+        # Headless playback through the same step() the game used; paused
+        # frames never reached the simulation
+        sim = Simulation(self.level, shapes[self.shape], self.seed)
+        for bits in self.frames:
+            if not bits & REPLAY_PAUSE:
+                sim.step(bits)
+        return sim
+
+    def validate(self, shapes):
+        sim = self.simulate(shapes)
+        return sim.tick == self.ticks and sim.score == self.score, sim
+
+class StatsStore:
+    # High scores and run statistics in SQLite. The game only queues runs;
+    # a daemon thread commits them in batches, one transaction per batch, so
+    # game over never waits on the disk. Queued runs stay in self.pending
+    # until committed and are merged into every read. Reads go through a
+    # second, read-only connection and only touch the leaderboard index and
+    # the per-level aggregates, so they cost the same with a million runs
+    # recorded. Once the run log grows past history_limit it is compacted to
+    # the best keep_top runs per level and language plus the latest
+    # keep_recent; the aggregates already hold everything else
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            played_at REAL NOT NULL,
+            level INTEGER NOT NULL,
+            language TEXT NOT NULL,
+            shape TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            score REAL NOT NULL,
+            ticks INTEGER NOT NULL,
+            powerups INTEGER NOT NULL,
+            death_cause TEXT,
+            assisted INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_leaderboard ON runs (level, language, assisted, score DESC);
+        CREATE TABLE IF NOT EXISTS level_stats (
+            level INTEGER PRIMARY KEY,
+            runs INTEGER NOT NULL,
+            total_ticks INTEGER NOT NULL,
+            best_ticks INTEGER NOT NULL,
+            best_score REAL NOT NULL,
+            powerups INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS frame_stats (
+            run_id INTEGER NOT NULL,
+            phase TEXT NOT NULL,
+            mean_ms REAL NOT NULL,
+            p95_ms REAL NOT NULL,
+            p99_ms REAL NOT NULL,
+            PRIMARY KEY (run_id, phase)
+        ) WITHOUT ROWID;
+    '''
+    RUN_FIELDS = ('played_at', 'level', 'language', 'shape', 'seed', 'score', 'ticks', 'powerups', 'death_cause', 'assisted')
+
+    def __init__(self, path, flush_interval=1.0, batch_size=256, history_limit=RUN_HISTORY_LIMIT,
+                 keep_top=100, keep_recent=RUN_HISTORY_LIMIT // 2):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.history_limit = history_limit
+        self.keep_top = keep_top
+        self.keep_recent = keep_recent
+        self.queue = queue.Queue()
+        self.pending = []
+        # Held while a batch commits and leaves self.pending, so a read never
+        # sees a run twice or not at all
+        self.lock = threading.Lock()
+        self.reader = None
+        self.writer = threading.Thread(target=self.write_loop, name='stats-writer', daemon=True)
+        self.writer.start()
+
+    def record_run(self, run, frame_stats=None):
+        # run holds RUN_FIELDS; frame_stats is a FrameProfiler.run_summary()
+        with self.lock:
+            self.pending.append(run)
+        self.queue.put((run, frame_stats))
+
+    def close(self):
+        # Flushes whatever is queued, then stops the writer. The read-only
+        # connection goes first so the writer's is last and removes the WAL
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.queue.put(None)
+        self.writer.join()
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        db = sqlite3.connect(self.path)
+        # auto_vacuum only takes effect before the first table is created
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        # Checkpoints run after each batch, outside self.lock
+        db.execute('PRAGMA wal_autocheckpoint = 0')
+        db.executescript(self.SCHEMA)
+        return db
+
+    def write_loop(self):
+        db = self.connect()
+        run_count = db.execute('SELECT count(*) FROM runs').fetchone()[0]
+        if run_count > self.history_limit:
+            run_count = self.compact(db)
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # Collect whatever else arrives within flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+            self.write_batch(db, batch)
+            db.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            run_count += len(batch)
+            if run_count > self.history_limit:
+                run_count = self.compact(db)
+        db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.close()
+
+    def write_batch(self, db, batch):
+        insert = f"INSERT INTO runs ({', '.join(self.RUN_FIELDS)}) VALUES ({', '.join('?' * len(self.RUN_FIELDS))})"
+        with self.lock:
+            with db:
+                for run, frame_stats in batch:
+                    run_id = db.execute(insert, [run[field] for field in self.RUN_FIELDS]).lastrowid
+                    if frame_stats:
+                        db.executemany('INSERT INTO frame_stats VALUES (?, ?, ?, ?, ?)',
+                                       [(run_id, phase, stats['mean'], stats['p95'], stats['p99'])
+                                        for phase, stats in frame_stats.items()])
+                    # Assisted runs are kept in the log but stay out of the stats
+                    if not run['assisted']:
+                        db.execute('''INSERT INTO level_stats VALUES (?, 1, ?, ?, ?, ?)
+                                      ON CONFLICT (level) DO UPDATE SET
+                                          runs = runs + 1,
+                                          total_ticks = total_ticks + excluded.total_ticks,
+                                          best_ticks = max(best_ticks, excluded.best_ticks),
+                                          best_score = max(best_score, excluded.best_score),
+                                          powerups = powerups + excluded.powerups''',
+                                   (run['level'], run['ticks'], run['ticks'], run['score'], run['powerups']))
+            del self.pending[:len(batch)]
+
+    def compact(self, db):
+        with db:
+            db.execute('''DELETE FROM runs
+                          WHERE id NOT IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)
+                            AND id NOT IN (SELECT id FROM (SELECT id, row_number() OVER (
+                                               PARTITION BY level, language, assisted ORDER BY score DESC) AS rank
+                                           FROM runs) WHERE rank <= ?)''', (self.keep_recent, self.keep_top))
+            db.execute('DELETE FROM frame_stats WHERE run_id NOT IN (SELECT id FROM runs)')
+        # executescript steps the pragma to the end; execute() frees a single page
+        db.executescript('PRAGMA incremental_vacuum')
+        return db.execute('SELECT count(*) FROM runs').fetchone()[0]
+
+    def read(self, query, params):
+        # Read-only, so the menu never creates the database or waits on the
+        # writer; before the first run is committed there is nothing to read
+        try:
+            if self.reader is None:
+                self.reader = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            return self.reader.execute(query, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+
+    def top_runs(self, level, language, limit=5):
+        # Best unassisted (score, ticks, shape) runs, straight off the index
+        with self.lock:
+            rows = self.read('''SELECT score, ticks, shape FROM runs
+                                WHERE level = ? AND language = ? AND assisted = 0
+                                ORDER BY score DESC LIMIT ?''', (level, language, limit))
+            rows.extend((run['score'], run['ticks'], run['shape']) for run in self.pending
+                        if run['level'] == level and run['language'] == language and not run['assisted'])
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows[:limit]
+
+    def level_stats(self, level):
+        # Unassisted runs, total and best ticks survived, best score and
+        # pickups on a level, or None before its first run
+        with self.lock:
+            rows = self.read('SELECT runs, total_ticks, best_ticks, best_score, powerups FROM level_stats WHERE level = ?', (level,))
+            runs, total_ticks, best_ticks, best_score, powerups = rows[0] if rows else (0, 0, 0, 0.0, 0)
+            for run in self.pending:
+                if run['level'] == level and not run['assisted']:
+                    runs += 1
+                    total_ticks += run['ticks']
+                    best_ticks = max(best_ticks, run['ticks'])
+                    best_score = max(best_score, run['score'])
+                    powerups += run['powerups']
+        if not runs:
+            return None
+        return {'runs': runs, 'total_ticks': total_ticks, 'best_ticks': best_ticks,
+                'best_score': best_score, 'powerups': powerups}
+
+class GhostTrack:
+    # The player's position every `step` ticks of one run, stored as
+    # interleaved int16 x, y pairs after a fixed header, so any window of
+    # samples is a single contiguous read
+    MAGIC = b'CRGH'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBBIBBI')
+    Info = namedtuple('GhostInfo', ['path', 'level', 'seed', 'shape', 'step', 'samples'])
+
+    def __init__(self, level, seed, shape, step=GHOST_STEP):
+        self.level = level
+        self.seed = seed
+        self.shape = shape
+        self.step = step
+        self.positions = []
+
+    def record(self, tick, x, y):
+        if tick % self.step == 0:
+            self.positions.append(round(x))
+            self.positions.append(round(y))
+
+    @classmethod
+    def from_replay(cls, replay, shapes, step=GHOST_STEP):
+        sim = Simulation(replay.level, shapes[replay.shape], replay.seed)
+        track = cls(replay.level, replay.seed, replay.shape, step)
+        track.record(0, sim.player.x, sim.player.y)
+        for bits in replay.frames:
+            if not bits & REPLAY_PAUSE:
+                sim.step(bits)
+                track.record(sim.tick, sim.player.x, sim.player.y)
+        return track
+
+    def save(self, path):
+        # Written under a temporary name first, so a fetch or scan never
+        # sees half a file
+        with open(path + '.part', 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.level, self.seed,
+                                     self.shape, self.step, len(self.positions) // 2))
+            f.write(np.array(self.positions, dtype='<i2').tobytes())
+        os.replace(path + '.part', path)
+
+    @classmethod
+    def read_info(cls, path):
+        with open(path, 'rb') as f:
+            header = f.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise ValueError(f"{path} is not a CyberRunner ghost")
+        magic, version, level, seed, shape, step, samples = cls.HEADER.unpack(header)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} CyberRunner ghost")
+        return cls.Info(path, level, seed, shape, step, samples)
+
+    @classmethod
+    def read_window(cls, path, start, count):
+        # (n, 2) positions of samples start to start + count, fewer at the end of the run
+        with open(path, 'rb') as f:
+            f.seek(cls.HEADER.size + start * 4)
+            return np.frombuffer(f.read(count * 4), dtype='<i2').reshape(-1, 2)
+
+class GhostCrowd:
+    # Every ghost of a race, read GHOST_WINDOW samples at a time into one
+    # (ghosts, samples, 2) array by a loader thread that stays a window ahead
+    # of the race. The main loop never touches the disk: a window that isn't
+    # in yet just hides the ghosts until it is
+    def __init__(self, tracks):
+        self.paths = [track.path for track in tracks]
+        self.shapes = np.array([track.shape for track in tracks], dtype=np.intp)
+        self.windows = {}
+        self.requested = set()
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.loader = threading.Thread(target=self.load_loop, name='ghost-loader', daemon=True)
+        self.loader.start()
+        self.request(0)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def request(self, index):
+        if index not in self.requested:
+            self.requested.add(index)
+            self.requests.put(index)
+
+    def load_loop(self):
+        while True:
+            index = self.requests.get()
+            if index is None:
+                return
+            # One sample past the window, to interpolate across the seam.
+            # Samples after a ghost's run ended stay GHOST_HIDDEN
+            start = index * GHOST_WINDOW
+            window = np.full((len(self.paths), GHOST_WINDOW + 1, 2), GHOST_HIDDEN, dtype=np.int16)
+            for i, path in enumerate(self.paths):
+                samples = GhostTrack.read_window(path, start, GHOST_WINDOW + 1)
+                window[i, :len(samples)] = samples
+            with self.lock:
+                self.windows[index] = window
+                for old in [old for old in self.windows if old < index - 1]:
+                    del self.windows[old]
+
+    def positions(self, t):
+        # Shapes and interpolated (x, y) of the ghosts still running at
+        # sample time t, or None while that window is loading
+        index = int(t) // GHOST_WINDOW
+        self.request(index + 1)
+        window = self.windows.get(index)
+        if window is None:
+            self.request(index)
+            return None
+        i = int(t) - index * GHOST_WINDOW
+        a = window[:, i]
+        b = window[:, i + 1]
+        visible = a[:, 0] != GHOST_HIDDEN
+        a = a[visible].astype(np.float32)
+        # A ghost's last sample has nothing after it and holds still
+        b = np.where(b[visible] == GHOST_HIDDEN, a, b[visible])
+        return self.shapes[visible], a + (b - a) * (t - int(t))
+
+    def close(self):
+        self.requests.put(None)
+
+class GhostLibrary:
+    # The ghost tracks available to race: a directory, or a ghost server
+    # whose files are downloaded into the cache. Scanning and fetching run on
+    # a background thread; races started before it finishes have no ghosts
+    def __init__(self, source, save_dir=GHOST_DIR):
+        self.source = source
+        self.save_dir = save_dir
+        self.tracks = []
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        threading.Thread(target=self.load, name='ghost-library', daemon=True).start()
+
+    def load(self):
+        try:
+            if self.source.startswith(('http://', 'https://')):
+                directory = self.fetch(self.source)
+            else:
+                directory = self.source
+            if os.path.isdir(directory):
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith('.crg'):
+                        self.add(os.path.join(directory, name))
+        except (OSError, ValueError) as error:
+            print(f"Could not load ghosts from {self.source}: {error}", file=sys.stderr)
+        self.ready.set()
+
+    def fetch(self, url):
+        # index.json lists the server's ghost files; ones already in the
+        # cache are not downloaded again
+        directory = os.path.join(CACHE_DIR, 'ghosts', urllib.parse.urlsplit(url).netloc.replace(':', '_'))
+        os.makedirs(directory, exist_ok=True)
+        with urllib.request.urlopen(url.rstrip('/') + '/index.json', timeout=10) as response:
+            names = json.load(response)
+        for name in names:
+            path = os.path.join(directory, os.path.basename(name))
+            if not os.path.exists(path):
+                with urllib.request.urlopen(url.rstrip('/') + '/' + urllib.parse.quote(name), timeout=10) as response:
+                    data = response.read()
+                with open(path + '.part', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.part', path)
+        return directory
+
+    def add(self, path):
+        try:
+            track = GhostTrack.read_info(path)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return
+        # The crowd interpolates every ghost on the same sample clock
+        if track.step == GHOST_STEP:
+            with self.lock:
+                self.tracks.append(track)
+
+    def select(self, level, seed, count):
+        # Ghosts of the level, those of the same seed first, longest runs first
+        with self.lock:
+            tracks = [track for track in self.tracks if track.level == level]
+        tracks.sort(key=lambda track: (track.seed != seed, -track.samples))
+        return tracks[:count]
+
+    def save(self, track):
+        # Off the main loop; the saved run can be raced from the next one on
+        def write():
+            path = reserve_run_path(self.save_dir, track.seed, '.crg')
+            track.save(path)
+            self.add(path)
+        threading.Thread(target=write, name='ghost-save').start()
+
+class Game:
+    def __init__(self, profile=False, profile_out=None, replay_dir=None, render_fps=FPS, max_catchup=MAX_CATCHUP_TICKS,
+                 report_startup=False, render_scale=1.0, fullscreen=False, seed=None, stats_path=None, ghosts=None, crowd=1,
+                 low_latency=False, latency_report=False):
+        startup_phase('imports')
+        init_display()
+        startup_phase('display init')
+        # Everything is drawn into self.screen at render_scale times the
+        # logical SCREEN_WIDTH x SCREEN_HEIGHT; game logic never sees pixels.
+        # Fullscreen hands the frame to SDL, which scales it to the monitor's
+        # resolution on the GPU. A window smaller than the frame gets it
+        # stretched by present() instead
+        self.render_scale = render_scale
+        render_size = (round(SCREEN_WIDTH * render_scale), round(SCREEN_HEIGHT * render_scale))
+        if fullscreen:
+            self.display = pygame.display.set_mode(render_size, pygame.FULLSCREEN | pygame.SCALED)
+            self.mouse_scale = render_scale
+        else:
+            self.display = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.mouse_scale = 1.0
+        if self.display.get_size() == render_size:
+            self.screen = self.display
+        else:
+            # Same pixel format as the window, so the stretch needs no conversion
+            self.screen = pygame.Surface(render_size).convert(self.display)
+        sprites.set_scale(render_scale)
         pygame.display.set_caption("CyberRunner 2077")
+        startup_phase('window')
         self.clock = pygame.time.Clock()
-        self.font_large = pygame.font.SysFont('arial', 48, bold=True)
-        self.font_medium = pygame.font.SysFont('arial', 32)
-        self.font_small = pygame.font.SysFont('arial', 24)
+        self.render_fps = render_fps  # 0 renders as fast as possible
+        self.max_catchup = max_catchup
+        self.report_startup = report_startup
+        # Low latency sleeps before polling input instead of after the flip;
+        # the probe times jump presses from key to screen
+        self.low_latency = low_latency
+        self.latency_probe = LatencyProbe() if latency_report else None
 
         self.language = 'en'
         self.texts = {
@@ -234,7 +1799,13 @@ class Game:
                 'change_char': "Change Character",
                 'change_lang': "Change Language",
                 'level': "Level: ",
-                'press_l_lang': "Press L to change language"
+                'press_l_lang': "Press L to change language",
+                'autopilot': "AUTOPILOT (A)",
+                'high_scores': "HIGH SCORES - LEVEL ",
+                'no_runs': "No runs yet",
+                'runs': "Runs: ",
+                'best_time': "Best: ",
+                'avg_time': "Avg: "
             },
             'az': {
                 'title': "SAYBERRUNNER 2077",
@@ -255,12 +1826,18 @@ class Game:
                 'change_char': "Karakteri Dəyiş",
                 'change_lang': "Dili Dəyiş",
                 'level': "Səviyyə: ",
-                'press_l_lang': "Dili dəyişmək üçün L basın"
+                'press_l_lang': "Dili dəyişmək üçün L basın",
+                'autopilot': "AVTOPİLOT (A)",
+                'high_scores': "REKORDLAR - SƏVİYYƏ ",
+                'no_runs': "Hələ oyun yoxdur",
+                'runs': "Oyunlar: ",
+                'best_time': "Ən yaxşı: ",
+                'avg_time': "Orta: "
             }
         }
 
         self.selected_shape = 'rect'
-        self.shapes = ['rect', 'circle', 'ellipse', 'triangle', 'square']
+        self.shapes = SHAPES
         self.selected_level = 1
 
         self.menu_buttons = []
@@ -271,278 +1848,1390 @@ class Game:
 
         self.day_time = 0
         self.cycle_period = 3600  # 60 seconds cycle
-
+        self.background_layers = {}
+        self.effects_rng = np.random.default_rng()
+
+        # Menu, pause and game-over screens are composed once into blit lists
+        # and rebuilt only when their text changes. Paused and game-over
+        # frames don't move, so they are frozen after the first draw
+        self.screen_layers = {}
+        self.dim_overlay = None
+        self.frozen_frame = None
+
+        # F3 toggles the profiler overlay; --profile-out records every frame
+        self.profiler = FrameProfiler()
+        self.profiler.enabled = self.show_profiler = profile
+        self.profile_out = profile_out
+        if profile_out:
+            self.profiler.enabled = self.profiler.recording = True
+
+        # Every finished run is saved to replay_dir; playback feeds a saved
+        # replay's frames in place of the keyboard
+        self.replay_dir = replay_dir
+        self.replay = None
+        self.playback = None
+
+        # A toggles the lookahead autopilot while playing; a run it drove
+        # for even one tick is recorded as assisted
+        self.autopilot = None
+        self.run_assisted = False
+
+        # With a fixed seed every run of a level plays the same obstacles
+        self.level_seed = seed
+
+        # Finished runs go to the stats store, which writes in the background
+        self.stats = StatsStore(stats_path) if stats_path else None
+
+        # Ghost racing: each race gets the best `crowd` ghosts of its level
+        # from the library, and every finished run is saved as a new ghost
+        self.ghost_library = GhostLibrary(ghosts) if ghosts else None
+        self.crowd_size = crowd
+        self.ghost_crowd = None
+        self.ghost_track = None
+
+        self.sim = Simulation(self.selected_level, self.selected_shape)
         self.reset_game()
+        startup_phase('game setup')
+
+    # Fonts load on first use, so the menu only pays for the ones it shows
+    @property
+    def font_large(self):
+        return get_font('arial', round(48 * self.render_scale), bold=True)
+
+    @property
+    def font_medium(self):
+        return get_font('arial', round(32 * self.render_scale))
+
+    @property
+    def font_small(self):
+        return get_font('arial', round(24 * self.render_scale))
+
+    def at(self, *values):
+        # Logical coordinates (and sizes) to render pixels
+        scale = self.render_scale
+        return tuple(value * scale for value in values)
+
+    def present(self):
+        if self.screen is not self.display:
+            pygame.transform.scale(self.screen, self.display.get_size(), self.display)
 
     def start_game(self):
+        # Sprites are baked before the first run rather than at launch
+        sprites.build(OBSTACLE_TYPES, self.shapes, [NEON_BLUE, NEON_GREEN])
         self.reset_game()
+        self.start_ghosts()
         self.game_state = PLAYING
 
+    def start_ghosts(self):
+        if self.ghost_crowd is not None:
+            self.ghost_crowd.close()
+            self.ghost_crowd = None
+        if self.ghost_library is None:
+            return
+        for shape in self.shapes:
+            sprites.ghost(shape)
+        tracks = self.ghost_library.select(self.selected_level, self.sim.seed, self.crowd_size)
+        if tracks:
+            self.ghost_crowd = GhostCrowd(tracks)
+
     def change_character(self):
         idx = self.shapes.index(self.selected_shape)
         self.selected_shape = self.shapes[(idx + 1) % len(self.shapes)]
+        self.invalidate_screens()
 
     def change_language(self):
         self.language = 'az' if self.language == 'en' else 'en'
+        self.prerender_texts()
+        self.invalidate_screens()
+
+    def prerender_texts(self):
+        # Render the static strings of the current language once per switch
+        texts = self.texts[self.language]
+        static_texts = [
+            ('title', self.font_large, NEON_BLUE),
+            ('press_l_lang', self.font_small, WHITE),
+            ('play', self.font_small, BLACK),
+            ('change_lang', self.font_small, BLACK),
+            ('invincible', self.font_small, NEON_GREEN),
+            ('game_paused', self.font_large, NEON_BLUE),
+            ('press_p_continue', self.font_medium, WHITE),
+            ('game_over', self.font_large, RED),
+            ('press_r_restart', self.font_medium, NEON_GREEN),
+        ]
+        for key, font, color in static_texts:
+            text_cache.render(font, texts[key], True, color)
 
     def change_level(self):
         self.selected_level = (self.selected_level % 10) + 1
-
-    def reset_game(self):
-        self.player = Player(100, SCREEN_HEIGHT - 200)
-        self.player.shape = self.selected_shape
-        self.obstacles = []
-        self.score = 0
-        self.starting_speed = (self.selected_level - 1) * 0.5
-        self.game_speed = self.starting_speed
+        self.invalidate_screens()
+
+    def reset_game(self, seed=None):
+        if seed is None:
+            seed = self.level_seed if self.level_seed is not None else random.randrange(2 ** 32)
+        self.sim.level = self.selected_level
+        self.sim.shape = self.selected_shape
+        self.sim.reset(seed, LevelSchedule.load(self.selected_level, seed))
+        if self.replay_dir:
+            self.replay = Replay(seed, self.selected_level, self.shapes.index(self.selected_shape))
+        if self.autopilot is not None:
+            self.autopilot.reset()
+        self.run_assisted = False
+        self.profiler.start_run()
+        if self.latency_probe is not None:
+            self.latency_probe.discard()
+        if self.ghost_library is not None:
+            self.ghost_track = GhostTrack(self.selected_level, seed, self.shapes.index(self.selected_shape))
+            self.ghost_track.record(0, self.sim.player.x, self.sim.player.y)
         self.game_state = MENU
-        self.obstacle_timer = 0
-        self.multiplier = 1
-        self.multiplier_timer = 0
-        self.background_stars = self.generate_stars(100)
+        self.background_stars = self.generate_stars(STAR_COUNT)
         self.day_time = 0
 
     def generate_stars(self, count):
-        stars = []
-        for _ in range(count):
-            stars.append({
-                'x': random.randint(0, SCREEN_WIDTH),
-                'y': random.randint(0, SCREEN_HEIGHT),
-                'size': random.randint(1, 3),
-                'speed': random.uniform(0.1, 0.5)
-            })
-        return stars
+        return Starfield(count, self.effects_rng)
 
     def update_background(self):
-        for star in self.background_stars:
-            star['x'] -= star['speed'] + self.game_speed * 0.1
-            if star['x'] < 0:
-                star['x'] = SCREEN_WIDTH
-                star['y'] = random.randint(0, SCREEN_HEIGHT)
-
-    def draw_background(self):
-        # Compute brightness for day/night
-        angle = (self.day_time / self.cycle_period) * 2 * math.pi
-        brightness = (math.sin(angle) + 1) / 2  # 0 to 1
+        self.background_stars.update(-self.sim.game_speed * 0.1)
 
-        # Draw gradient background adjusted for brightness
+    def build_background_layer(self, brightness):
+        # Bake the gradient into a one pixel wide strip and stretch it across the screen
+        factor = 0.5 + brightness * 1.5
+        strip = pygame.Surface((1, SCREEN_HEIGHT))
         for y in range(SCREEN_HEIGHT):
             ratio = y / SCREEN_HEIGHT
             base_r = int(DARK_BLUE[0] * (1 - ratio) + DARK_PURPLE[0] * ratio)
             base_g = int(DARK_BLUE[1] * (1 - ratio) + DARK_PURPLE[1] * ratio)
             base_b = int(DARK_BLUE[2] * (1 - ratio) + DARK_PURPLE[2] * ratio)
-            r = min(255, int(base_r * (0.5 + brightness * 1.5)))
-            g = min(255, int(base_g * (0.5 + brightness * 1.5)))
-            b = min(255, int(base_b * (0.5 + brightness * 1.5)))
-            pygame.draw.line(self.screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
-
-        # Draw stars (more visible at night)
-        for star in self.background_stars:
-            alpha = int(255 * (1 - brightness))
-            color = (255, 255, 255)  # White
-            pygame.draw.circle(self.screen, color, (int(star['x']), int(star['y'])), star['size'])
+            r = min(255, int(base_r * factor))
+            g = min(255, int(base_g * factor))
+            b = min(255, int(base_b * factor))
+            strip.set_at((0, y), (r, g, b))
+        layer = pygame.transform.scale(strip, (SCREEN_WIDTH, SCREEN_HEIGHT)).convert(self.screen)
 
         # Draw ground
-        pygame.draw.rect(self.screen, (40, 40, 40), (0, SCREEN_HEIGHT - 50, SCREEN_WIDTH, 50))
+        pygame.draw.rect(layer, (40, 40, 40), (0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT))
 
         # Draw neon grid lines on ground
         for i in range(0, SCREEN_WIDTH, 40):
-            pygame.draw.line(self.screen, NEON_BLUE, (i, SCREEN_HEIGHT - 50), (i, SCREEN_HEIGHT), 2)
+            pygame.draw.line(layer, NEON_BLUE, (i, SCREEN_HEIGHT - GROUND_HEIGHT), (i, SCREEN_HEIGHT), 2)
+        if layer.get_size() != self.screen.get_size():
+            layer = pygame.transform.smoothscale(layer, self.screen.get_size())
+        return layer
+
+    def get_background_layer(self, brightness):
+        level = int(brightness * (BRIGHTNESS_LEVELS - 1) + 0.5)
+        layer = self.background_layers.get(level)
+        if layer is None:
+            layer = self.background_layers[level] = self.build_background_layer(level / (BRIGHTNESS_LEVELS - 1))
+        return layer
 
-    def spawn_obstacle(self):
-        obstacle_types = ["red", "green", "purple", "neutral"]
-        weights = [0.4, 0.2, 0.2, 0.2]
-        obstacle_type = random.choices(obstacle_types, weights=weights)[0]
-        y_pos = SCREEN_HEIGHT - 50
-
-        if obstacle_type == "red":
-            y_pos = random.randint(SCREEN_HEIGHT - 200, SCREEN_HEIGHT - 60)
-        elif obstacle_type in ["green", "purple"]:
-            y_pos = random.randint(SCREEN_HEIGHT - 180, SCREEN_HEIGHT - 80)
-        else:
-            y_pos = SCREEN_HEIGHT - 110
-
-        self.obstacles.append(Obstacle(SCREEN_WIDTH, y_pos, obstacle_type))
-
-    def check_collisions(self):
-        player_rect = self.player.get_rect()
-
-        for obstacle in self.obstacles[:]:
-            if player_rect.colliderect(obstacle.get_rect()):
-                if obstacle.type == "red":
-                    if not self.player.invincible:
-                        self.game_state = GAME_OVER
-                    else:
-                        self.obstacles.remove(obstacle)
-                elif obstacle.type == "green":
-                    self.player.activate_invincibility()
-                    self.obstacles.remove(obstacle)
-                elif obstacle.type == "purple":
-                    self.multiplier = 2
-                    self.multiplier_timer = 300
-                    self.obstacles.remove(obstacle)
-                else:
-                    self.obstacles.remove(obstacle)
+    def draw_background(self):
+        # Compute brightness for day/night
+        angle = (self.day_time / self.cycle_period) * 2 * math.pi
+        brightness = (math.sin(angle) + 1) / 2  # 0 to 1
 
-    def update_multiplier(self):
-        if self.multiplier_timer > 0:
-            self.multiplier_timer -= 1
-            if self.multiplier_timer <= 0:
-                self.multiplier = 1
+        # Gradient, ground and grid come from the cached layer in a single blit
+        self.screen.blit(self.get_background_layer(brightness), (0, 0))
+
+        # Draw stars (more visible at night), kept behind the ground
+        self.screen.set_clip(self.at(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT - GROUND_HEIGHT))
+        alpha = int(255 * (1 - brightness))
+        self.background_stars.draw(self.screen, WHITE, alpha, self.render_scale)
+        self.screen.set_clip(None)
+
+    def draw_obstacles(self, alpha=1.0):
+        # One batched blit for every obstacle on screen, interpolated like Obstacle.draw
+        scale = self.render_scale
+        self.screen.blits([(sprites.obstacle(obstacle.type), ((obstacle.prev_x + (obstacle.x - obstacle.prev_x) * alpha) * scale, obstacle.y * scale))
+                           for obstacle in self.sim.obstacles], False)
+
+    def draw_ghosts(self, alpha=1.0):
+        # Interpolated like Player.draw: alpha runs from the previous tick to this one
+        if self.ghost_crowd is None:
+            return
+        found = self.ghost_crowd.positions(max(0.0, (self.sim.tick - 1 + alpha) / GHOST_STEP))
+        if found is None:
+            return
+        shapes, positions = found
+        ghost_sprites = [sprites.ghost(shape) for shape in self.shapes]
+        self.screen.blits(list(zip([ghost_sprites[shape] for shape in shapes.tolist()],
+                                   (positions * self.render_scale).tolist())), False)
 
     def draw_ui(self):
-        score_text = self.font_medium.render(self.texts[self.language]['score'] + str(int(self.score)), True, NEON_BLUE)
-        self.screen.blit(score_text, (20, 20))
-
-        if self.multiplier > 1:
-            multiplier_text = self.font_small.render(self.texts[self.language]['score_x'] + str(self.multiplier), True, NEON_PURPLE)
-            self.screen.blit(multiplier_text, (SCREEN_WIDTH - 150, 20))
-            timer_width = (self.multiplier_timer / 300) * 100
-            pygame.draw.rect(self.screen, NEON_PURPLE, (SCREEN_WIDTH - 150, 50, timer_width, 10))
-
-        if self.player.invincible:
-            inv_text = self.font_small.render(self.texts[self.language]['invincible'], True, NEON_GREEN)
-            self.screen.blit(inv_text, (SCREEN_WIDTH - 150, 70))
-            timer_width = (self.player.invincible_timer / 300) * 100
-            pygame.draw.rect(self.screen, NEON_GREEN, (SCREEN_WIDTH - 150, 100, timer_width, 10))
-
-        speed_text = self.font_small.render(self.texts[self.language]['speed'] + str(int(self.game_speed * 10)), True, NEON_PINK)
-        self.screen.blit(speed_text, (SCREEN_WIDTH - 150, 120))
+        score_text = text_cache.render(self.font_medium, self.texts[self.language]['score'] + str(int(self.sim.score)), True, NEON_BLUE)
+        self.screen.blit(score_text, self.at(20, 20))
+
+        if self.autopilot is not None:
+            autopilot_text = text_cache.render(self.font_small, self.texts[self.language]['autopilot'], True, NEON_PINK)
+            self.screen.blit(autopilot_text, self.at(20, 60))
+
+        if self.sim.multiplier > 1:
+            multiplier_text = text_cache.render(self.font_small, self.texts[self.language]['score_x'] + str(self.sim.multiplier), True, NEON_PURPLE)
+            self.screen.blit(multiplier_text, self.at(SCREEN_WIDTH - 150, 20))
+            timer_width = (self.sim.multiplier_timer / 300) * 100
+            pygame.draw.rect(self.screen, NEON_PURPLE, self.at(SCREEN_WIDTH - 150, 50, timer_width, 10))
+
+        if self.sim.player.invincible:
+            inv_text = text_cache.render(self.font_small, self.texts[self.language]['invincible'], True, NEON_GREEN)
+            self.screen.blit(inv_text, self.at(SCREEN_WIDTH - 150, 70))
+            timer_width = (self.sim.player.invincible_timer / 300) * 100
+            pygame.draw.rect(self.screen, NEON_GREEN, self.at(SCREEN_WIDTH - 150, 100, timer_width, 10))
+
+        speed_text = text_cache.render(self.font_small, self.texts[self.language]['speed'] + str(int(self.sim.game_speed * 10)), True, NEON_PINK)
+        self.screen.blit(speed_text, self.at(SCREEN_WIDTH - 150, 120))
+
+    def invalidate_screens(self):
+        self.screen_layers.clear()
+
+    def get_screen_layer(self, name, compose):
+        layer = self.screen_layers.get(name)
+        if layer is None:
+            layer = compose()
+            self.screen_layers[name] = layer
+        return layer
+
+    def centered(self, font, key, color, center):
+        text = text_cache.render(font, self.texts[self.language][key], True, color)
+        return text, text.get_rect(center=self.at(*center))
+
+    def get_dim_overlay(self):
+        # A flat surface with surface alpha blends faster than a per-pixel one
+        if self.dim_overlay is None:
+            self.dim_overlay = pygame.Surface(self.screen.get_size()).convert(self.screen)
+            self.dim_overlay.fill(BLACK)
+            self.dim_overlay.set_alpha(180)
+        return self.dim_overlay
+
+    def compose_menu(self):
+        lang_text = text_cache.render(self.font_small, self.texts[self.language]['press_l_lang'], True, WHITE)
+        layer = [self.centered(self.font_large, 'title', NEON_BLUE, (SCREEN_WIDTH // 2, 100)),
+                 (lang_text, self.at(SCREEN_WIDTH - 250, SCREEN_HEIGHT - 30))]
+        layer.extend(button.render(self.render_scale) for button in self.menu_buttons)
+        if self.stats is not None:
+            layer.extend(self.compose_leaderboard())
+        return layer
+
+    def compose_leaderboard(self):
+        # Top five for the selected level and language, left of the buttons
+        texts = self.texts[self.language]
+        font = self.font_small
+        lines = [(texts['high_scores'] + str(self.selected_level), NEON_PINK)]
+        top = self.stats.top_runs(self.selected_level, self.language)
+        lines.extend((f"{rank}. {int(score)}  {ticks / FPS:.1f}s  {shape}", WHITE)
+                     for rank, (score, ticks, shape) in enumerate(top, 1))
+        level_stats = self.stats.level_stats(self.selected_level)
+        if level_stats is None:
+            lines.append((texts['no_runs'], WHITE))
+        else:
+            lines.append((texts['runs'] + str(level_stats['runs']), NEON_GREEN))
+            lines.append((f"{texts['best_time']}{level_stats['best_ticks'] / FPS:.1f}s  "
+                          f"{texts['avg_time']}{level_stats['total_ticks'] / level_stats['runs'] / FPS:.1f}s", NEON_GREEN))
+        return [(text_cache.render(font, line, True, color), self.at(40, 200 + 30 * i))
+                for i, (line, color) in enumerate(lines)]
+
+    def compose_pause_screen(self):
+        bar = pygame.Surface(self.at(10, 200)).convert(self.screen)
+        bar.fill(WHITE)
+        return [
+            (self.get_dim_overlay(), (0, 0)),
+            self.centered(self.font_large, 'game_paused', NEON_BLUE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50)),
+            self.centered(self.font_medium, 'press_p_continue', WHITE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50)),
+            # Two pause lines ||
+            (bar, self.at(SCREEN_WIDTH // 2 - 20, SCREEN_HEIGHT // 2 - 100)),
+            (bar, self.at(SCREEN_WIDTH // 2 + 10, SCREEN_HEIGHT // 2 - 100)),
+        ]
+
+    def compose_game_over(self):
+        return [
+            (self.get_dim_overlay(), (0, 0)),
+            self.centered(self.font_large, 'game_over', RED, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100)),
+            self.centered(self.font_medium, 'press_r_restart', NEON_GREEN, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100)),
+        ]
 
     def draw_menu(self):
-        self.draw_background()
-
-        title_text = self.font_large.render(self.texts[self.language]['title'], True, NEON_BLUE)
-        title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 100))
-        self.screen.blit(title_text, title_rect)
-
-        lang_text = self.font_small.render(self.texts[self.language]['press_l_lang'], True, WHITE)
-        self.screen.blit(lang_text, (SCREEN_WIDTH - 250, SCREEN_HEIGHT - 30))
-
-        for button in self.menu_buttons:
-            button.draw()
+        self.screen.blits(self.get_screen_layer('menu', self.compose_menu), doreturn=False)
 
     def draw_pause_screen(self):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        self.screen.blit(overlay, (0, 0))
-
-        pause_text = self.font_large.render(self.texts[self.language]['game_paused'], True, NEON_BLUE)
-        pause_rect = pause_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
-        self.screen.blit(pause_text, pause_rect)
-
-        continue_text = self.font_medium.render(self.texts[self.language]['press_p_continue'], True, WHITE)
-        continue_rect = continue_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
-        self.screen.blit(continue_text, continue_rect)
-
-        # Draw two pause lines ||
-        pygame.draw.rect(self.screen, WHITE, (SCREEN_WIDTH // 2 - 20, SCREEN_HEIGHT // 2 - 100, 10, 200))
-        pygame.draw.rect(self.screen, WHITE, (SCREEN_WIDTH // 2 + 10, SCREEN_HEIGHT // 2 - 100, 10, 200))
+        self.screen.blits(self.get_screen_layer('pause', self.compose_pause_screen), doreturn=False)
 
     def draw_game_over(self):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blits(self.get_screen_layer('game_over', self.compose_game_over), doreturn=False)
+        score_text = text_cache.render(self.font_medium, self.texts[self.language]['final_score'] + str(int(self.sim.score)), True, NEON_BLUE)
+        score_rect = score_text.get_rect(center=self.at(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        self.screen.blit(score_text, score_rect)
 
-        game_over_text = self.font_large.render(self.texts[self.language]['game_over'], True, RED)
-        game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
-        self.screen.blit(game_over_text, game_over_rect)
+    def handle_event(self, event):
+        # Returns the action bits the event contributes to this frame
+        actions = 0
+        if event.type == pygame.QUIT:
+            self.running = False
 
-        score_text = self.font_medium.render(self.texts[self.language]['final_score'] + str(int(self.score)), True, NEON_BLUE)
-        score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-        self.screen.blit(score_text, score_rect)
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                self.show_profiler = not self.show_profiler
+            if self.game_state == MENU:
+                if event.key == pygame.K_l:
+                    self.change_language()
+                if event.key == pygame.K_SPACE:
+                    self.start_game()
+            elif self.game_state == PLAYING:
+                if event.key == pygame.K_SPACE:
+                    actions |= ACTION_JUMP
+                if event.key == pygame.K_p:
+                    self.game_state = PAUSED
+                if event.key == pygame.K_a:
+                    self.autopilot = None if self.autopilot else Autopilot()
+                if event.key == pygame.K_ESCAPE:
+                    self.game_state = MENU
+            elif self.game_state == PAUSED:
+                if event.key == pygame.K_p:
+                    self.game_state = PLAYING
+                if event.key == pygame.K_ESCAPE:
+                    self.game_state = MENU
+            elif self.game_state == GAME_OVER:
+                if event.key == pygame.K_r:
+                    self.reset_game()
+                    self.start_ghosts()
+                    self.game_state = PLAYING
+                if event.key == pygame.K_ESCAPE:
+                    self.game_state = MENU
+
+        if event.type == pygame.MOUSEBUTTONDOWN and self.game_state == MENU:
+            x, y = pygame.mouse.get_pos()
+            pos = (x / self.mouse_scale, y / self.mouse_scale)
+            for button in self.menu_buttons:
+                button.handle_click(pos)
+        return actions
+
+    def held_actions(self):
+        keys = pygame.key.get_pressed()
+        actions = 0
+        if keys[pygame.K_LEFT]:
+            actions |= ACTION_LEFT
+        if keys[pygame.K_RIGHT]:
+            actions |= ACTION_RIGHT
+        return actions
+
+    def start_playback(self, replay):
+        self.selected_level = replay.level
+        self.selected_shape = self.shapes[replay.shape]
+        self.reset_game(replay.seed)
+        self.game_state = PLAYING
+        self.playback = iter(replay.frames)
+
+    def playback_actions(self):
+        bits = next(self.playback, None)
+        if bits is None:
+            self.playback = None
+            return 0
+        if bits & REPLAY_PAUSE:
+            self.game_state = PAUSED
+            return 0
+        self.game_state = PLAYING
+        return bits
+
+    def record_tick(self, actions):
+        if self.replay is None or self.sim.game_over:
+            return
+        if self.game_state == PLAYING:
+            self.replay.record(actions)
+        elif self.game_state == PAUSED:
+            self.replay.record(REPLAY_PAUSE)
+
+    def save_replay(self):
+        replay = self.replay
+        replay.ticks = self.sim.tick
+        replay.score = self.sim.score
+        replay.save(reserve_run_path(self.replay_dir, replay.seed, '.crr'))
+        self.replay = None
+
+    def record_run(self):
+        # Only queues the run; the menu layers are rebuilt to show it
+        sim = self.sim
+        run = {'played_at': time.time(), 'level': sim.level, 'language': self.language, 'shape': sim.shape,
+               'seed': sim.seed, 'score': sim.score, 'ticks': sim.tick, 'powerups': sim.powerups,
+               'death_cause': sim.death_cause, 'assisted': self.run_assisted}
+        self.stats.record_run(run, self.profiler.run_summary() if self.profiler.enabled else None)
+        self.invalidate_screens()
+
+    def update(self, actions):
+        if self.game_state != PLAYING:
+            return
+        self.sim.step(actions)
+        if self.ghost_track is not None:
+            self.ghost_track.record(self.sim.tick, self.sim.player.x, self.sim.player.y)
+        if self.sim.game_over:
+            self.game_state = GAME_OVER
+            if self.replay is not None:
+                self.save_replay()
+            if self.stats is not None and self.playback is None:
+                self.record_run()
+            if self.ghost_track is not None and self.playback is None:
+                self.ghost_library.save(self.ghost_track)
+            self.ghost_track = None
+        self.profiler.mark('update')
+        self.sim.player.update_trail(actions & (ACTION_LEFT | ACTION_RIGHT), self.effects_rng)
+        self.update_background()
+        self.day_time += 1
+
+    def draw(self, alpha=1.0):
+        profiler = self.profiler
+        frozen = self.game_state == PAUSED or self.game_state == GAME_OVER
+        if not frozen:
+            self.frozen_frame = None
+        elif self.frozen_frame is not None and self.frozen_frame[0] == self.game_state:
+            self.screen.blit(self.frozen_frame[1], (0, 0))
+            self.present()
+            self.draw_profiler()
+            profiler.mark('screens')
+            return
 
-        restart_text = self.font_medium.render(self.texts[self.language]['press_r_restart'], True, NEON_GREEN)
-        restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100))
-        self.screen.blit(restart_text, restart_rect)
+        self.draw_background()
+        profiler.mark('background')
+
+        if self.game_state == PLAYING or self.game_state == PAUSED:
+            self.draw_obstacles(alpha)
+            profiler.mark('obstacles')
+            self.draw_ghosts(alpha)
+            profiler.mark('ghosts')
+            self.sim.player.draw(self.screen, alpha, self.render_scale)
+            profiler.mark('player')
+            self.draw_ui()
+            profiler.mark('ui')
+
+        if self.game_state == MENU:
+            self.draw_menu()
+
+        if self.game_state == PAUSED:
+            self.draw_pause_screen()
+
+        if self.game_state == GAME_OVER:
+            self.draw_game_over()
+
+        if frozen:
+            self.frozen_frame = (self.game_state, self.screen.copy())
+        self.present()
+        self.draw_profiler()
+        profiler.mark('screens')
+
+    def draw_profiler(self):
+        # Drawn on the window after present(), so it stays legible at any render scale
+        if self.show_profiler:
+            pool = self.sim.pool.stats()
+            cache = text_cache.stats()
+            self.profiler.draw(self.display, [
+                f"obstacles live {pool['live']} free {pool['free']} peak {pool['high_water']}",
+                f"text cache {cache['size']} hits {cache['hits']} misses {cache['misses']}",
+            ])
 
     def run(self):
-        running = True
+        self.game_loop()
+        if self.profile_out:
+            self.profiler.export(self.profile_out)
+        if self.latency_probe is not None:
+            print(self.latency_probe.report('low latency' if self.low_latency else 'standard'))
+        if self.stats is not None:
+            self.stats.close()
+        if self.ghost_crowd is not None:
+            self.ghost_crowd.close()
+        pygame.quit()
+        sys.exit()
 
-        while running:
+    def game_loop(self):
+        # Fixed-rate simulation: wall time is banked in an accumulator and spent
+        # in whole FPS ticks, so gameplay speed no longer depends on the render
+        # rate. Under load several ticks run per rendered frame (up to
+        # max_catchup); the render interpolates between the last two ticks.
+        # Low latency mode renders once per tick instead: it sleeps until the
+        # next tick is due, then polls, ticks and draws that newest tick, so a
+        # press is never held over a sleep and never drawn a tick behind
+        self.running = True
+        profiler = self.profiler
+        probe = self.latency_probe
+        tick_length = 1 / FPS
+        accumulator = 0.0
+        pending = 0  # jump presses wait for the next tick
+        previous = time.perf_counter()
+
+        while self.running:
+            profiler.enabled = self.show_profiler or profiler.recording
+            profiler.begin_frame()
+            if self.low_latency:
+                wait = tick_length - accumulator - (time.perf_counter() - previous)
+                if wait > 0:
+                    time.sleep(wait)
+                profiler.mark('tick')
+            polled = time.perf_counter()
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-                if event.type == pygame.KEYDOWN:
-                    if self.game_state == MENU:
-                        if event.key == pygame.K_l:
-                            self.change_language()
-                        if event.key == pygame.K_SPACE:
-                            self.start_game()
-                    elif self.game_state == PLAYING:
-                        if event.key == pygame.K_SPACE:
-                            self.player.jump()
-                        if event.key == pygame.K_p:
-                            self.game_state = PAUSED
-                        if event.key == pygame.K_ESCAPE:
-                            self.game_state = MENU
-                    elif self.game_state == PAUSED:
-                        if event.key == pygame.K_p:
-                            self.game_state = PLAYING
-                        if event.key == pygame.K_ESCAPE:
-                            self.game_state = MENU
-                    elif self.game_state == GAME_OVER:
-                        if event.key == pygame.K_r:
-                            self.reset_game()
-                            self.game_state = PLAYING
-                        if event.key == pygame.K_ESCAPE:
-                            self.game_state = MENU
-
-                if event.type == pygame.MOUSEBUTTONDOWN and self.game_state == MENU:
-                    pos = pygame.mouse.get_pos()
-                    for button in self.menu_buttons:
-                        button.handle_click(pos)
-
-            keys = pygame.key.get_pressed()
-            if self.game_state == PLAYING:
-                if keys[pygame.K_LEFT]:
-                    self.player.move("left")
-                if keys[pygame.K_RIGHT]:
-                    self.player.move("right")
-
-            if self.game_state == PLAYING:
-                self.player.update()
-                self.update_background()
-                for obstacle in self.obstacles[:]:
-                    obstacle.update(self.game_speed)
-                    if obstacle.x < -obstacle.width:
-                        self.obstacles.remove(obstacle)
-                        self.score += 10 * self.multiplier
-                self.obstacle_timer += 1
-                level_factor = (self.selected_level - 1) * 2
-                if self.obstacle_timer > 60 - min(50, self.game_speed * 5 + level_factor):
-                    self.spawn_obstacle()
-                    self.obstacle_timer = 0
-                self.check_collisions()
-                self.update_multiplier()
-                self.score += 0.1 * self.multiplier
-                self.game_speed = self.starting_speed + min(10, self.score / 1000)
-                self.day_time += 1
-
-            self.draw_background()
-
-            if self.game_state == PLAYING or self.game_state == PAUSED:
-                for obstacle in self.obstacles:
-                    obstacle.draw(self.screen)
-                self.player.draw(self.screen)
-                self.draw_ui()
-
-            if self.game_state == MENU:
-                self.draw_menu()
-
-            if self.game_state == PAUSED:
-                self.draw_pause_screen()
-
-            if self.game_state == GAME_OVER:
-                self.draw_game_over()
+                actions = self.handle_event(event)
+                if actions and probe is not None:
+                    probe.press(event, polled)
+                pending |= actions
+            profiler.mark('events')
+
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            held = self.held_actions() if self.game_state == PLAYING else 0
+            ticks = 0
+            while accumulator >= tick_length and ticks < self.max_catchup:
+                if self.playback is not None:
+                    actions = self.playback_actions()
+                elif self.autopilot is not None and self.game_state == PLAYING:
+                    actions = self.autopilot(self.sim)
+                    self.run_assisted = True
+                else:
+                    actions = pending | held if self.game_state == PLAYING else 0
+                pending = 0
+                self.record_tick(actions)
+                self.update(actions)
+                if probe is not None and ticks == 0:
+                    # Presses polled this frame went into this tick
+                    probe.tick(self.sim.tick)
+                accumulator -= tick_length
+                ticks += 1
+            if ticks == self.max_catchup:
+                # Too far behind to catch up: drop the backlog and slow down
+                accumulator = min(accumulator, tick_length)
+            alpha = 1.0 if self.low_latency else accumulator / tick_length
+            self.draw(alpha)
 
             pygame.display.flip()
-            self.clock.tick(FPS)
-
-        pygame.quit()
-        sys.exit()
+            if probe is not None:
+                probe.flip(self.sim.tick - 1 + alpha, time.perf_counter())
+            profiler.mark('flip')
+            if self.report_startup:
+                startup_phase('first frame')
+                print(startup_report())
+                self.report_startup = False
+            # Low latency has already slept; the clock only keeps count
+            self.clock.tick(0 if self.low_latency else self.render_fps)
+            profiler.mark('tick')
+            profiler.end_frame()
+
+# Scripted policies for headless runs: make_policy(name, seed) returns a
+# callable taking the Simulation and returning action bits
+def idle_policy(seed):
+    return lambda sim: 0
+
+def random_policy(seed):
+    rng = random.Random(seed ^ 0x5EED)
+    return lambda sim: rng.choice((0, 0, 0, ACTION_LEFT, ACTION_RIGHT, ACTION_JUMP))
+
+def dodge_policy(seed):
+    # Jump over red obstacles at running height when they get close
+    def policy(sim):
+        player = sim.player
+        for obstacle in sim.obstacles:
+            gap = obstacle.x - (player.x + player.width)
+            if obstacle.type == "red" and -obstacle.width < gap < 60 + sim.game_speed * 6 \
+                    and obstacle.y + obstacle.height > SCREEN_HEIGHT - 50 - player.height:
+                return ACTION_JUMP
+        return 0
+    return policy
+
+def search_policy(seed):
+    return Autopilot()
+
+POLICIES = {
+    'idle': idle_policy,
+    'random': random_policy,
+    'dodge': dodge_policy,
+    'search': search_policy,
+}
+
+def make_policy(name, seed):
+    return POLICIES[name](seed)
+
+ROLLOUT_FIELDS = ['policy', 'level', 'seed', 'ticks', 'score', 'powerups', 'death_cause']
+
+def run_episode(job):
+    policy_name, level, seed, max_ticks = job
+    sim = Simulation(level, seed=seed)
+    state = sim.run(make_policy(policy_name, seed), max_ticks)
+    return {
+        'policy': policy_name,
+        'level': level,
+        'seed': seed,
+        'ticks': state.tick,
+        'score': round(state.score, 1),
+        'powerups': sim.powerups,
+        'death_cause': sim.death_cause or 'timeout',
+    }
+
+def parse_levels(text):
+    levels = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            levels.extend(range(int(first), int(last) + 1))
+        else:
+            levels.append(int(part))
+    return levels
+
+def drop_partial_line(path):
+    # An interrupted sweep can leave half a record at the end of the file;
+    # cut it back to the last newline so the file reads and appends cleanly
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+
+def read_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        for key in ('level', 'seed', 'ticks', 'powerups'):
+            row[key] = int(row[key])
+        row['score'] = float(row['score'])
+    return rows
+
+def summarize_results(rows):
+    # Percentiles of survival time and score per (policy, level)
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['policy'], row['level']), []).append(row)
+    print(f"{'policy':<8} {'level':>5} {'runs':>6} {'p10 s':>8} {'p50 s':>8} {'p90 s':>8} {'p50 score':>10} {'p90 score':>10}")
+    for (policy_name, level), group in sorted(groups.items()):
+        seconds = np.percentile([row['ticks'] / FPS for row in group], [10, 50, 90])
+        scores = np.percentile([row['score'] for row in group], [50, 90])
+        print(f"{policy_name:<8} {level:>5} {len(group):>6} {seconds[0]:>8.1f} {seconds[1]:>8.1f} {seconds[2]:>8.1f} {scores[0]:>10.0f} {scores[1]:>10.0f}")
+
+def rollout(args):
+    # Episodes already in the output file are skipped, so an interrupted
+    # sweep picks up where it left off
+    drop_partial_line(args.out)
+    done = {(row['policy'], row['level'], row['seed']) for row in read_results(args.out)}
+    jobs = [(args.policy, level, seed, args.max_ticks)
+            for level in parse_levels(args.levels)
+            for seed in range(args.first_seed, args.first_seed + args.seeds)
+            if (args.policy, level, seed) not in done]
+    print(f"{len(jobs)} episodes to run, {len(done)} already recorded in {args.out}")
+
+    as_csv = args.out.endswith('.csv')
+    write_header = as_csv and (not os.path.exists(args.out) or os.path.getsize(args.out) == 0)
+    pool = multiprocessing.Pool(args.workers)
+    with open(args.out, 'a', newline='') as f:
+        writer = csv.DictWriter(f, ROLLOUT_FIELDS) if as_csv else None
+        if write_header:
+            writer.writeheader()
+        for i, result in enumerate(pool.imap_unordered(run_episode, jobs, chunksize=4), 1):
+            if as_csv:
+                writer.writerow(result)
+            else:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            if i % 100 == 0:
+                print(f"  {i}/{len(jobs)}", flush=True)
+    pool.close()
+    pool.join()
+
+    summarize_results([row for row in read_results(args.out) if row['policy'] == args.policy])
+
+def jump_heights():
+    # The player's y on the ground and then after each tick of a jump, up to
+    # the tick it lands
+    player = Player(100, SCREEN_HEIGHT - 60 - GROUND_HEIGHT)
+    player.update()
+    heights = [player.y]
+    player.jump()
+    while True:
+        player.update()
+        if not player.is_jumping:
+            return heights
+        heights.append(player.y)
+
+def check_schedules(schedules, ticks, margin=0, history=None):
+    # Red-only, fixed-pace screen of many level schedules at once, in
+    # lockstep. The player's reachable states are one uint64 per jump phase
+    # (0 on the ground, k for k ticks into a jump) with a bit per x it can be
+    # at, 64 steps of Player.speed from the left edge; each tick they spread
+    # one step sideways and one phase on, and the reds overlapping them are
+    # masked out. This is a reduced model, not the game: only reds count (no
+    # green invincibility) and obstacles move at the pace of a run that picks
+    # nothing up; margin (pixels added to each side of a red) allows for
+    # pickups shifting the pace. Its verdicts are screened, not proven, and
+    # confirm_schedule checks them against Simulation. Returns the ticks each
+    # run lasts in the model; history, for a single schedule, collects its
+    # reachable states after every tick for find_witness
+    n = len(schedules)
+    template = Player(100, 0)
+    heights = jump_heights()
+    phases = len(heights)
+    red_width, red_height = OBSTACLE_SPECS['red'][:2]
+    red_masks = np.zeros(256, dtype=np.uint64)
+    for offset in range(OBSTACLE_SPECS['red'][3][1] - SCHEDULE_Y_BASE + 1):
+        top = SCHEDULE_Y_BASE + offset
+        red_masks[offset] = sum(1 << phase for phase, y in enumerate(heights)
+                                if y < top + red_height and y + template.height > top)
+    phase_bits = np.arange(phases, dtype=np.uint64)
+    type_widths = np.array([OBSTACLE_SPECS[t][0] for t in OBSTACLE_TYPES], dtype=np.float64)
+    red = OBSTACLE_TYPES.index('red')
+    obstacle_speed = Obstacle(0, 0, 'red').speed
+    step = template.speed
+    left = template.x % step  # x of bit 0
+    # A red at ox hits the player at x when ox - width < x < ox + red_width
+    reach_low = -template.width - margin - left
+    reach_high = red_width + margin - left
+    window = (left - red_width - margin, left + 63 * step + template.width + margin)
+
+    # Live obstacles sit in a per-run ring; all of a run's obstacles move
+    # together, so each only needs the distance scrolled when it spawned
+    slots = 16
+    levels = np.array([schedule.level for schedule in schedules])
+    starting_speed = (levels - 1) * 0.5
+    level_factor = (levels - 1) * 2
+    game_speed = starting_speed.copy()
+    score = np.zeros(n)
+    timer = np.zeros(n, dtype=np.int64)
+    spawned = np.zeros(n, dtype=np.int64)
+    scrolled = np.zeros(n)
+    spawn_scrolled = np.zeros((n, slots))
+    widths = np.zeros((n, slots))
+    masks = np.zeros((n, slots), dtype=np.uint64)
+    live = np.zeros((n, slots), dtype=bool)
+    # Phase-major, so each phase's row is contiguous
+    reach = np.zeros((phases, n), dtype=np.uint64)
+    reach[0] = np.uint64(1 << (template.x // step))
+    moved = np.empty_like(reach)
+    shifted = np.empty_like(reach)
+    one = np.uint64(1)
+    survived = np.full(n, ticks)
+    running = np.ones(n, dtype=bool)
+
+    # Schedule entries copied into arrays, grown a chunk at a time
+    types = np.zeros((n, SCHEDULE_CHUNK), dtype=np.uint8)
+    offsets = np.zeros((n, SCHEDULE_CHUNK), dtype=np.uint8)
+    available = np.zeros(n, dtype=np.int64)
+
+    for tick in range(ticks):
+        scrolled += obstacle_speed + game_speed
+        x = SCREEN_WIDTH - (scrolled[:, None] - spawn_scrolled)
+        culled = live & (x < -widths)
+        score += 10 * culled.sum(axis=1)
+        live &= ~culled
+        near_runs, near_slots = np.nonzero(live & (masks != 0) & (x > window[0]) & (x < window[1]))
+        near_x = x[near_runs, near_slots]
+        near_masks = masks[near_runs, near_slots]
+
+        timer += 1
+        spawning = np.flatnonzero(timer > 60 - np.minimum(50, game_speed * 5 + level_factor))
+        if len(spawning):
+            short = spawning[spawned[spawning] >= available[spawning]]
+            if len(short):
+                if available[short].max() >= types.shape[1]:
+                    types = np.pad(types, ((0, 0), (0, types.shape[1])))
+                    offsets = np.pad(offsets, ((0, 0), (0, offsets.shape[1])))
+                for i in short:
+                    schedule = schedules[i]
+                    start = available[i]
+                    schedule.entry(start + SCHEDULE_CHUNK - 1)
+                    types[i, start:start + SCHEDULE_CHUNK] = np.frombuffer(schedule.types, dtype=np.uint8, count=SCHEDULE_CHUNK, offset=start)
+                    offsets[i, start:start + SCHEDULE_CHUNK] = np.frombuffer(schedule.heights, dtype=np.uint8, count=SCHEDULE_CHUNK, offset=start)
+                    available[i] = start + SCHEDULE_CHUNK
+            index = spawned[spawning]
+            slot = index % slots
+            if live[spawning, slot].any():
+                raise RuntimeError("more obstacles on screen than check_schedules has slots for")
+            kind = types[spawning, index]
+            spawn_scrolled[spawning, slot] = scrolled[spawning]
+            widths[spawning, slot] = type_widths[kind]
+            masks[spawning, slot] = np.where(kind == red, red_masks[offsets[spawning, index]], 0)
+            live[spawning, slot] = True
+            spawned[spawning] += 1
+            timer[spawning] = 0
+
+        # Step sideways (or not), then jump, fall or land
+        np.left_shift(reach, one, out=moved)
+        moved |= reach
+        np.right_shift(reach, one, out=shifted)
+        moved |= shifted
+        reach[2:] = moved[1:-1]
+        reach[1] = moved[0]
+        np.bitwise_or(moved[0], moved[-1], out=reach[0])
+
+        if len(near_runs):
+            # The x bits each red covers, at every phase it is level with.
+            # Runs with two reds in reach are masked once per red
+            first = np.clip(np.floor((near_x + reach_low) / step) + 1, 0, 64).astype(np.uint64)
+            last = np.clip(np.ceil((near_x + reach_high) / step), 0, 64).astype(np.uint64)
+            span = np.where(last - first >= 64, np.uint64(0xFFFFFFFFFFFFFFFF),
+                            ((one << ((last - first) & np.uint64(63))) - one) << (first & np.uint64(63)))
+            hit = ((near_masks >> phase_bits[:, None]) & one).astype(bool)
+            allowed = ~np.where(hit, span, np.uint64(0))
+            runs = near_runs
+            repeat = np.r_[False, runs[1:] == runs[:-1]]
+            while True:
+                reach[:, runs[~repeat]] &= allowed[:, ~repeat]
+                if not repeat.any():
+                    break
+                runs, allowed = runs[repeat], allowed[:, repeat]
+                repeat = np.r_[False, runs[1:] == runs[:-1]]
+
+            # Only a run that was just masked can have run out of states
+            runs = np.unique(near_runs)
+            died = runs[running[runs] & ~reach[:, runs].any(axis=0)]
+            if len(died):
+                survived[died] = tick + 1
+                running[died] = False
+                if not running.any():
+                    break
+        if history is not None:
+            history.append(reach[:, 0].copy())
+        score += 0.1
+        game_speed = starting_speed + np.minimum(10, score / 1000)
+    return survived
+
+def find_witness(schedule, ticks, margin=0):
+    # One way through check_schedules' model of a schedule, as action bits
+    # per tick, traced back from a state still reachable at the end; None
+    # when the screen finds none
+    history = []
+    if check_schedules([schedule], ticks, margin, history)[0] < ticks:
+        return None
+    template = Player(100, 0)
+    phases = len(history[0])
+    start = np.zeros(phases, dtype=np.uint64)
+    start[0] = np.uint64(1 << (template.x // template.speed))
+    history.insert(0, start)
+    phase = next(p for p in range(phases) if history[-1][p])
+    row = int(history[-1][phase])
+    bit = (row & -row).bit_length() - 1
+    actions = bytearray(ticks)
+    for tick in range(ticks, 0, -1):
+        # Undo one tick: a step of at most one bit, and one phase back (the
+        # ground is reached from the ground or the last phase of a jump)
+        before = history[tick - 1]
+        came_from = [(p, b) for p in ((phase - 1,) if phase else (0, phases - 1))
+                     for b in (bit, bit - 1, bit + 1) if 0 <= b < 64 and int(before[p]) >> b & 1]
+        from_phase, from_bit = came_from[0]
+        action = ACTION_RIGHT if bit > from_bit else ACTION_LEFT if bit < from_bit else 0
+        if phase == 1:
+            action |= ACTION_JUMP
+        actions[tick - 1] = action
+        phase, bit = from_phase, from_bit
+    return bytes(actions)
+
+def confirm_schedule(schedule, ticks, margin=0, screened=True):
+    # Plays a schedule under the real rules: the screen's witness first when
+    # it passed, then the autopilot. Returns the most ticks either survived,
+    # ticks meaning the level is confirmed survivable
+    sim = Simulation(schedule.level, seed=schedule.seed)
+    best = 0
+    witness = find_witness(schedule, ticks, margin) if screened else None
+    if witness is not None:
+        sim.reset(schedule.seed, schedule)
+        best = sim.run(lambda sim: witness[sim.tick], ticks).tick
+        if best >= ticks:
+            return ticks
+    sim.reset(schedule.seed, schedule)
+    return max(best, sim.run(Autopilot(beam=8, depth=16), ticks).tick)
+
+def check_batch(job):
+    # Screens a batch of seeds, then confirms the passes (confirm 'passes')
+    # or every seed (confirm 'all') under the real rules. Seeds cached with
+    # verified_ticks covering ticks are not replayed. Confirmed holds the
+    # real ticks survived, -1 where not tried; timing is (seconds screening,
+    # seconds playing, seeds played)
+    level, first_seed, count, ticks, margin, confirm, save_dir = job
+    seeds = range(first_seed, first_seed + count)
+    cached = [LevelSchedule.load(level, seed, save_dir) if save_dir else None for seed in seeds]
+    schedules = [schedule or LevelSchedule(level, seed) for schedule, seed in zip(cached, seeds)]
+    start = time.perf_counter()
+    survived = check_schedules(schedules, ticks, margin)
+    screened = time.perf_counter()
+    played = 0
+    confirmed = np.full(count, -1)
+    for i, schedule in enumerate(schedules):
+        passed = survived[i] == ticks
+        if cached[i] is not None and cached[i].verified_ticks >= ticks:
+            confirmed[i] = ticks
+        elif confirm == 'all' or confirm == 'passes' and passed:
+            confirmed[i] = confirm_schedule(schedule, ticks, margin, passed)
+            played += 1
+            if save_dir and confirmed[i] == ticks:
+                schedule.verified_ticks = ticks
+                schedule.save(save_dir)
+    return level, first_seed, survived, confirmed, (screened - start, time.perf_counter() - screened, played)
+
+def validate_levels(args):
+    # Screens (level, seed) pairs with check_schedules across a process pool,
+    # optionally checking the verdicts with confirm_schedule
+    levels = parse_levels(args.levels)
+    confirm = 'all' if args.confirm else 'passes' if args.save else None
+    jobs = [(level, first, min(args.batch, args.first_seed + args.seeds - first), args.ticks, args.margin,
+             confirm, LEVEL_CACHE_DIR if args.save else None)
+            for level in levels
+            for first in range(args.first_seed, args.first_seed + args.seeds, args.batch)]
+    results = {level: [] for level in levels}
+    # Worker seconds spent screening and playing, and seeds played
+    timings = np.zeros(3)
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(args.workers)
+    for level, first_seed, survived, confirmed, timing in pool.imap_unordered(check_batch, jobs):
+        results[level].append((first_seed, survived, confirmed))
+        timings += timing
+    pool.close()
+    pool.join()
+    elapsed = time.perf_counter() - start
+
+    total = len(levels) * args.seeds
+    screen_seconds, play_seconds, played = timings
+    print(f"Screened {total} levels of {args.ticks / FPS:.0f} s in {screen_seconds:.1f} worker-seconds "
+          f"({total / screen_seconds:,.0f} per second per worker)")
+    if confirm:
+        per_seed = f" ({play_seconds / played:.1f} s each)" if played else ''
+        print(f"Played {played:.0f} under the real rules in {play_seconds:.1f} worker-seconds{per_seed}")
+    print(f"Took {elapsed:.1f} s in total on {args.workers} workers")
+    print("screen: red-only, fixed-pace model, no pickups; real: played under the game rules")
+    real_header = f" {'real pass':>9}" if confirm else ''
+    if confirm == 'all':
+        real_header += f" {'refuted':>7}"
+    print(f"{'level':>5} {'seeds':>7} {'screen':>7} {'p10 fail s':>11} {'p50 fail s':>11}{real_header}  first screen fails")
+    for level in levels:
+        results[level].sort(key=lambda result: result[0])
+        seeds = np.concatenate([np.arange(first, first + len(survived)) for first, survived, _ in results[level]])
+        survived = np.concatenate([survived for _, survived, _ in results[level]])
+        confirmed = np.concatenate([confirmed for _, _, confirmed in results[level]])
+        passed = survived == args.ticks
+        failed = survived[~passed] / FPS
+        p10, p50 = np.percentile(failed, [10, 50]) if len(failed) else (float('nan'), float('nan'))
+        real = ''
+        if confirm:
+            # Screen passes a real run got through, and screen fails it survived
+            held = (confirmed[passed] == args.ticks).mean() if passed.any() else float('nan')
+            real = f" {held:>9.1%}"
+        if confirm == 'all':
+            real += f" {np.sum(~passed & (confirmed == args.ticks)):>7}"
+        examples = ' '.join(str(seed) for seed in seeds[~passed][:5])
+        print(f"{level:>5} {len(survived):>7} {passed.mean():>7.1%} {p10:>11.1f} {p50:>11.1f}{real}  {examples}")
+        lost = seeds[passed & (confirmed >= 0) & (confirmed < args.ticks)]
+        if len(lost):
+            print(f"      screen passes not survived for real: {' '.join(str(seed) for seed in lost[:5])}")
+    if args.save:
+        print(f"Levels survived under the real rules cached in {LEVEL_CACHE_DIR}")
+
+def benchmark_collisions(counts=(1, 2, 5, 10, 20, 50, 100, 1000), ticks=2000):
+    # Per-tick cost of the offscreen cull plus collision pass, for the old
+    # list scan (a fresh Rect per obstacle, iterating a copy) and ObstacleQueue
+    player = Player(100, SCREEN_HEIGHT - 110)
+    print(f"{'obstacles':>9} {'list us':>9} {'queue us':>9} {'speedup':>8}")
+    crossover = None
+    for count in counts:
+        # Spread across the screen above the player so nothing is removed
+        obstacles = [Obstacle((i + 0.5) * SCREEN_WIDTH / count, 0, "neutral") for i in range(count)]
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for obstacle in obstacles[:]:
+                if obstacle.x < -obstacle.width:
+                    obstacles.remove(obstacle)
+            player_rect = player.get_rect()
+            for obstacle in obstacles[:]:
+                player_rect.colliderect(obstacle.get_rect())
+        list_time = (time.perf_counter() - start) / ticks
+
+        queue = ObstacleQueue(obstacles)
+        player_rect = pygame.Rect(0, 0, 0, 0)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            queue.cull_offscreen()
+            player_rect.update(player.x, player.y, player.width, player.height)
+            queue.overlapping(player_rect)
+        queue_time = (time.perf_counter() - start) / ticks
+
+        if crossover is None and queue_time < list_time:
+            crossover = count
+        print(f"{count:>9} {list_time * 1e6:>9.2f} {queue_time * 1e6:>9.2f} {list_time / queue_time:>7.1f}x")
+    print(f"ObstacleQueue is faster from {crossover} obstacles" if crossover else "ObstacleQueue was never faster")
+
+def time_ops(func, iterations, repeat=3):
+    # Best of a few runs, as operations per second
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return iterations / best
+
+def run_benchmarks(game, frames, selected=None):
+    screen = game.screen
+    benchmarks = []
+
+    def background():
+        game.day_time += 1
+        game.draw_background()
+    benchmarks.append(('draw_background', background, 300))
+
+    for obstacle_type in OBSTACLE_TYPES:
+        obstacle = Obstacle(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, obstacle_type)
+        benchmarks.append((f'obstacle_draw[{obstacle_type}]', lambda obstacle=obstacle: obstacle.draw(screen, 1.0, game.render_scale), 5000))
+
+    for shape in game.shapes:
+        player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        player.shape = shape
+        benchmarks.append((f'player_draw[{shape}]', lambda player=player: player.draw(screen, 1.0, game.render_scale), 5000))
+
+    def ui():
+        # Every HUD branch on, with the score ticking like in play
+        sim = game.sim
+        sim.score += 0.2
+        sim.multiplier = 2
+        sim.multiplier_timer = 150
+        sim.player.invincible = True
+        sim.player.invincible_timer = 150
+        game.draw_ui()
+    benchmarks.append(('draw_ui', ui, 2000))
+
+    for count in (10, 100, 1000):
+        # Spread across the screen above the player so nothing is removed
+        sim = Simulation()
+        for i in range(count):
+            sim.obstacles.spawn((i + 0.5) * SCREEN_WIDTH / count, 0, "neutral")
+        sim.player_rect.update(sim.player.x, sim.player.y, sim.player.width, sim.player.height)
+        benchmarks.append((f'check_collisions[{count}]', sim.check_collisions, 2000))
+
+    # 300 ghosts weaving across the screen, streamed from real files
+    ghost_dir = tempfile.mkdtemp()
+    tracks = []
+    for i in range(300):
+        track = GhostTrack(1, i, i % len(game.shapes))
+        for tick in range(0, GHOST_WINDOW * GHOST_STEP, GHOST_STEP):
+            track.record(tick, 100 + (i * 3 + tick) % 800, SCREEN_HEIGHT - 110 - (i * 7 + tick) % 200)
+        track.save(os.path.join(ghost_dir, f'{i}.crg'))
+        tracks.append(GhostTrack.read_info(os.path.join(ghost_dir, f'{i}.crg')))
+    crowd = GhostCrowd(tracks)
+    while 0 not in crowd.windows:
+        time.sleep(0.001)
+
+    def ghosts():
+        game.ghost_crowd = crowd
+        game.draw_ghosts(0.5)
+        game.ghost_crowd = None
+    benchmarks.append(('draw_ghosts[300]', ghosts, 1000))
+
+    autopilot = Autopilot()
+    sim = Simulation(level=5, seed=5)
+    for _ in range(300):
+        sim.step(autopilot(sim))
+    benchmarks.append(('autopilot_search', lambda: autopilot.search(sim), 20))
+
+    for level in range(1, 11):
+        def playthrough(level=level):
+            # Update and draw every frame exactly as run() does, minus the
+            # flip and frame cap, restarting whenever the bot dies
+            game.selected_level = level
+            game.reset_game(seed=level)
+            game.game_state = PLAYING
+            policy = dodge_policy(level)
+            for frame in range(frames):
+                game.update(policy(game.sim))
+                game.draw()
+                if game.game_state == GAME_OVER:
+                    game.reset_game(seed=level * 100000 + frame)
+                    game.game_state = PLAYING
+        benchmarks.append((f'playthrough[level {level}]', playthrough, 1))
+
+    results = {}
+    for name, func, iterations in benchmarks:
+        if selected and selected not in name:
+            continue
+        if name.startswith('playthrough'):
+            results[name] = time_ops(func, 1, repeat=1) * frames
+        else:
+            results[name] = time_ops(func, iterations)
+        print(f"  {name:<28} {results[name]:>14,.0f} ops/s", flush=True)
+    crowd.close()
+    shutil.rmtree(ghost_dir)
+    return results
+
+def benchmark(args):
+    # Under SDL's dummy driver unless the caller picked one
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    game = Game(render_scale=args.render_scale)
+    print(f"Running benchmarks ({args.frames} frames per playthrough)")
+    results = run_benchmarks(game, args.frames, args.filter)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline':>14} {'now':>14} {'change':>8}")
+    for name, ops in results.items():
+        if name not in baseline:
+            continue
+        change = ops / baseline[name] - 1
+        flag = ''
+        if change < -args.tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<28} {baseline[name]:>14,.0f} {ops:>14,.0f} {change:>+7.1%}{flag}")
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}: "
+              + ', '.join(regressions))
+        return 1
+    print(f"\nOK: no benchmark slower than baseline by more than {args.tolerance:.0%}")
+    return 0
+
+def stats_command(args):
+    if args.compact:
+        # The writer compacts on startup when over the limit
+        StatsStore(args.stats, history_limit=0).close()
+    store = StatsStore(args.stats)
+    for level in parse_levels(args.levels):
+        start = time.perf_counter()
+        top = store.top_runs(level, args.language, args.top)
+        level_stats = store.level_stats(level)
+        elapsed = time.perf_counter() - start
+        if level_stats is None:
+            print(f"level {level}: no runs")
+            continue
+        print(f"level {level}: {level_stats['runs']} runs, best {level_stats['best_ticks'] / FPS:.1f}s, "
+              f"mean {level_stats['total_ticks'] / level_stats['runs'] / FPS:.1f}s, best score {int(level_stats['best_score'])}, "
+              f"{level_stats['powerups']} pickups (read in {elapsed * 1000:.2f} ms)")
+        for rank, (score, ticks, shape) in enumerate(top, 1):
+            print(f"  {rank:>2}. {int(score):>8} {ticks / FPS:>7.1f}s  {shape}")
+    store.close()
+
+def post_presses(seconds, interval, rng):
+    # Jump presses at random moments, stamped when they are made. R restarts
+    # a run that died, so presses keep landing in play
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        time.sleep(interval * rng.uniform(0.5, 1.5))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_r))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE, pressed_at=time.perf_counter()))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+def latency_command(args):
+    # The same stream of presses through the standard loop, then the low
+    # latency one, in the real window unless SDL_VIDEODRIVER says otherwise
+    game = Game(render_fps=args.fps, render_scale=args.render_scale, latency_report=True)
+    totals = []
+    for low_latency in (False, True):
+        game.low_latency = low_latency
+        game.latency_probe = LatencyProbe()
+        game.start_game()
+        poster = threading.Thread(target=post_presses, args=(args.seconds, args.interval, random.Random(args.seed)))
+        poster.start()
+        game.game_loop()
+        poster.join()
+        print(game.latency_probe.report('low latency' if low_latency else f"standard (--fps {args.fps})"))
+        totals.append(game.latency_probe.summary().get('total'))
+    if all(totals):
+        standard, low = totals
+        print(f"press to flip p50 {standard['p50']:.1f} -> {low['p50']:.1f} ms, "
+              f"p95 {standard['p95']:.1f} -> {low['p95']:.1f} ms with --low-latency")
+    pygame.quit()
+
+def replay_command(args):
+    replay = Replay.load(args.file)
+    print(f"{args.file}: seed {replay.seed}, level {replay.level}, {SHAPES[replay.shape]}, "
+          f"{len(replay.frames)} frames, claimed score {int(replay.score)}")
+
+    start = time.perf_counter()
+    valid, sim = replay.validate(SHAPES)
+    elapsed = time.perf_counter() - start
+    print(f"replayed {sim.tick} ticks in {elapsed * 1000:.1f} ms: score {int(sim.score)} "
+          + ("VALID" if valid else f"MISMATCH (claimed {replay.score!r} over {replay.ticks} ticks, got {sim.score!r})"))
+
+    if args.watch:
+        game = Game()
+        game.start_playback(replay)
+        game.run()
+    return 0 if valid else 1
+
+def run_ghost(job):
+    # Shapes rotate with the seed so a generated crowd mixes all of them
+    policy_name, level, seed, max_ticks = job
+    sim = Simulation(level, SHAPES[seed % len(SHAPES)], seed)
+    track = GhostTrack(level, seed, seed % len(SHAPES))
+    track.record(0, sim.player.x, sim.player.y)
+    policy = make_policy(policy_name, seed)
+    while not sim.game_over and sim.tick < max_ticks:
+        sim.step(policy(sim))
+        track.record(sim.tick, sim.player.x, sim.player.y)
+    return f"level{level}-{policy_name}-{seed}.crg", track
+
+def make_ghosts(args):
+    # From recorded replays if any are given, otherwise from headless runs of a policy
+    os.makedirs(args.out, exist_ok=True)
+    if args.replays:
+        for path in args.replays:
+            track = GhostTrack.from_replay(Replay.load(path), SHAPES)
+            track.save(os.path.join(args.out, os.path.splitext(os.path.basename(path))[0] + '.crg'))
+        print(f"wrote {len(args.replays)} ghosts to {args.out}")
+        return
+    jobs = [(args.policy, level, seed, args.max_ticks)
+            for level in parse_levels(args.levels)
+            for seed in range(args.first_seed, args.first_seed + args.seeds)]
+    pool = multiprocessing.Pool(args.workers)
+    for name, track in pool.imap_unordered(run_ghost, jobs, chunksize=4):
+        track.save(os.path.join(args.out, name))
+    pool.close()
+    pool.join()
+    print(f"wrote {len(jobs)} ghosts to {args.out}")
+
+class GhostRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # A ghost directory over HTTP plus /index.json listing its ghosts.
+    # latency delays every response, to check fetching never stalls the game
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path != '/index.json':
+            return super().do_GET()
+        body = json.dumps(sorted(name for name in os.listdir(self.directory) if name.endswith('.crg'))).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def ghost_server(args):
+    GhostRequestHandler.latency = args.latency / 1000
+    handler = functools.partial(GhostRequestHandler, directory=args.dir)
+    with http.server.ThreadingHTTPServer((args.host, args.port), handler) as server:
+        print(f"serving ghosts from {args.dir} at http://{args.host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CyberRunner 2077")
+    commands = parser.add_subparsers(dest='command')
+
+    rollout_parser = commands.add_parser('rollout', help="run headless episodes across a process pool")
+    rollout_parser.add_argument('--policy', choices=sorted(POLICIES), default='dodge')
+    rollout_parser.add_argument('--levels', default='1-10', help="e.g. 1-10 or 1,3,5")
+    rollout_parser.add_argument('--seeds', type=int, default=100, help="episodes per level")
+    rollout_parser.add_argument('--first-seed', type=int, default=0)
+    rollout_parser.add_argument('--max-ticks', type=int, default=FPS * 600)
+    rollout_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    rollout_parser.add_argument('--out', default='rollouts.jsonl', help=".jsonl or .csv, appended to")
+
+    levels_parser = commands.add_parser('levels', help="screen level seeds with a red-only, fixed-pace model and confirm them")
+    levels_parser.add_argument('--levels', default='1-10', help="e.g. 1-10 or 1,3,5")
+    levels_parser.add_argument('--seeds', type=int, default=10000, help="seeds per level")
+    levels_parser.add_argument('--first-seed', type=int, default=0)
+    levels_parser.add_argument('--ticks', type=int, default=FPS * 60, help="how far into each level to check")
+    levels_parser.add_argument('--margin', type=float, default=0, help="pixels added to each side of a red, to allow for pickups shifting the pace")
+    levels_parser.add_argument('--batch', type=int, default=2000, help="seeds checked together per job")
+    levels_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    levels_parser.add_argument('--confirm', action='store_true', help="play every seed under the real rules too (about 20 s a seed)")
+    levels_parser.add_argument('--save', action='store_true', help=f"play the screen passes under the real rules and cache the ones survived in {LEVEL_CACHE_DIR}")
+
+    commands.add_parser('bench-collisions', help="compare the collision pass against a plain list scan")
+
+    replay_parser = commands.add_parser('replay', help="validate a recorded run headlessly, or watch it")
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--watch', action='store_true', help="play it back in the window at normal speed")
+
+    stats_parser = commands.add_parser('stats', help="print high scores and per-level statistics")
+    stats_parser.add_argument('--levels', default='1-10', help="e.g. 1-10 or 1,3,5")
+    stats_parser.add_argument('--language', choices=['en', 'az'], default='en')
+    stats_parser.add_argument('--top', type=int, default=5, help="runs listed per level")
+    stats_parser.add_argument('--compact', action='store_true', help="compact the run log now")
+
+    latency_parser = commands.add_parser('latency', help="time synthetic jump presses to the screen in both loop modes")
+    latency_parser.add_argument('--seconds', type=float, default=20, help="per mode")
+    latency_parser.add_argument('--interval', type=float, default=0.25, help="mean seconds between presses")
+    latency_parser.add_argument('--seed', type=int, default=0)
+
+    make_ghosts_parser = commands.add_parser('make-ghosts', help="write ghost files from replays or headless runs")
+    make_ghosts_parser.add_argument('replays', nargs='*', help=".crr replays to convert; without any, run --policy")
+    make_ghosts_parser.add_argument('--policy', choices=sorted(POLICIES), default='dodge')
+    make_ghosts_parser.add_argument('--levels', default='1', help="e.g. 1-10 or 1,3,5")
+    make_ghosts_parser.add_argument('--seeds', type=int, default=300, help="ghosts per level")
+    make_ghosts_parser.add_argument('--first-seed', type=int, default=0)
+    make_ghosts_parser.add_argument('--max-ticks', type=int, default=FPS * 120)
+    make_ghosts_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    make_ghosts_parser.add_argument('--out', default=GHOST_DIR)
+
+    ghost_server_parser = commands.add_parser('ghost-server', help="serve a ghost directory over HTTP for --ghosts URL")
+    ghost_server_parser.add_argument('--dir', default=GHOST_DIR)
+    ghost_server_parser.add_argument('--host', default='127.0.0.1')
+    ghost_server_parser.add_argument('--port', type=int, default=8765)
+    ghost_server_parser.add_argument('--latency', type=float, default=0, help="milliseconds added to every response")
+
+    bench_parser = commands.add_parser('bench', help="time rendering and simulation hot paths against a baseline")
+    bench_parser.add_argument('--baseline', default='bench_baseline.json')
+    bench_parser.add_argument('--save-baseline', action='store_true', help="record these results as the new baseline")
+    bench_parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    bench_parser.add_argument('--frames', type=int, default=10000, help="frames per scripted playthrough")
+    bench_parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+
+    parser.add_argument('--profile', action='store_true', help="start with the frame profiler overlay shown (F3 toggles)")
+    parser.add_argument('--profile-out', help="write per-frame phase timings to this .json or .csv file on exit")
+    parser.add_argument('--record-replays', metavar='DIR', help="save a replay of every finished run to DIR")
+    parser.add_argument('--fps', type=int, default=FPS, help=f"render frame cap, 0 for uncapped; the game always ticks at {FPS} Hz")
+    parser.add_argument('--render-scale', type=float, default=1.0, help="draw at this fraction of the window size and stretch (e.g. 0.5, 0.75)")
+    parser.add_argument('--fullscreen', action='store_true', help="fill the monitor at its native resolution")
+    parser.add_argument('--seed', type=int, help="play the levels of this seed (shared levels are a level and a seed)")
+    parser.add_argument('--stats', metavar='PATH', default=STATS_PATH, help="where high scores and run statistics are kept")
+    parser.add_argument('--no-stats', action='store_true', help="don't record runs or show high scores")
+    parser.add_argument('--ghosts', nargs='?', const=GHOST_DIR, metavar='SOURCE',
+                        help=f"race ghosts from a directory or ghost-server URL (default {GHOST_DIR}) and save each run as one")
+    parser.add_argument('--crowd', type=int, default=1, help="ghosts per race")
+    parser.add_argument('--low-latency', action='store_true', help="poll input right before each tick and draw the newest tick (renders at the tick rate)")
+    parser.add_argument('--latency-report', action='store_true', help="print jump press to screen latencies on exit")
+    parser.add_argument('--startup-report', action='store_true', help="print how long each startup phase took")
+    parser.add_argument('--max-catchup', type=int, default=MAX_CATCHUP_TICKS, help="ticks allowed per rendered frame when rendering falls behind")
+
+    args = parser.parse_args(argv)
+    if args.render_scale <= 0:
+        parser.error("--render-scale must be positive")
+    if args.seed is not None and not 0 <= args.seed < 2 ** 32:
+        parser.error("--seed must be between 0 and 2**32 - 1")
+    if args.command == 'rollout':
+        rollout(args)
+    elif args.command == 'levels':
+        validate_levels(args)
+    elif args.command == 'bench-collisions':
+        benchmark_collisions()
+    elif args.command == 'bench':
+        sys.exit(benchmark(args))
+    elif args.command == 'replay':
+        sys.exit(replay_command(args))
+    elif args.command == 'stats':
+        stats_command(args)
+    elif args.command == 'latency':
+        latency_command(args)
+    elif args.command == 'make-ghosts':
+        make_ghosts(args)
+    elif args.command == 'ghost-server':
+        ghost_server(args)
+    else:
+        game = Game(profile=args.profile, profile_out=args.profile_out, replay_dir=args.record_replays,
+                    render_fps=args.fps, max_catchup=args.max_catchup, report_startup=args.startup_report,
+                    render_scale=args.render_scale, fullscreen=args.fullscreen, seed=args.seed,
+                    stats_path=None if args.no_stats else args.stats, ghosts=args.ghosts, crowd=args.crowd,
+                    low_latency=args.low_latency, latency_report=args.latency_report)
+        game.run()
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    main()
\ No newline at end of file